@@ -1,43 +1,276 @@
+import asyncio as aio
+import hmac
+import io
+import json
 import logging
 from contextlib import asynccontextmanager
 import os
+import time
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.decorator import cache
-from joblib import load
-from redis import asyncio
 from datetime import datetime
-from pydantic import BaseModel, ConfigDict, Field, field_validator
-from typing import List
+from itertools import chain
+from operator import itemgetter
+from pydantic import (
+    BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter, ValidationError,
+    WithJsonSchema, field_validator,
+)
+from typing import (
+    Annotated, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple, Union,
+)
 import numpy as np
 
+from src import inference, metrics, prediction_cache, prediction_index, warmup
+from src.batching import MicroBatcher
+from src.inference import InferenceOverloaded
+from src.svr_engine import load_model, model_version
+
 logger = logging.getLogger(__name__)
 model = None
+# model loaded by the pre-fork server before it forks workers, see preload_model()
+preloaded_model = None
+preloaded_fingerprint = ""
+# set by the pre-fork server; a reload request only reaches one worker, so the
+# admin endpoint is refused when there are several
+worker_count = 1
+# also set by the pre-fork server: only worker 0 runs the once-per-pod work
+# (warm-up, purge of old versions, Redis eviction check and INFO polling,
+# saving recent houses)
+worker_number = 0
+# precomputed predictions for the served model, see src/prediction_index.py
+grid_index = None
+# bumped by every hot reload; a miss computed while it changed is not cached,
+# since it is unknown which model scored it
+model_generation = 0
 
 LOCAL_REDIS_URL = "redis://localhost:6379"
+MODEL_PATH = os.getenv("MODEL_PATH", "model_pipeline.pkl")
+# cache namespace of the served model; defaults to a content hash of
+# MODEL_PATH so a retrained model_pipeline.pkl never sees the old predictions
+MODEL_VERSION = os.getenv("MODEL_VERSION", "")
+# concurrent /predict misses are coalesced into one model call of up to
+# BATCH_MAX_SIZE rows, waiting at most BATCH_MAX_WAIT_MS for the batch to fill
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "2"))
+# rows scored per chunk by /bulk-predict-stream, bounds its peak memory
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "1000"))
+# Hot reload: MODEL_PATH is checked for changes every MODEL_RELOAD_INTERVAL_SECONDS
+# (0 disables the watcher), and POST /lab/admin/reload-model reloads it on
+# demand when MODEL_ADMIN_TOKEN is set
+MODEL_RELOAD_INTERVAL_SECONDS = float(os.getenv("MODEL_RELOAD_INTERVAL_SECONDS", "0"))
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+# a new model must give finite predictions for these houses before it is served
+VALIDATION_HOUSES = np.array([
+    [8.3252, 41.0, 6.98412698, 1.02380952, 322.0, 2.55555556, 37.88, -122.23],
+    [3.8462, 52.0, 6.28185328, 1.08108108, 565.0, 2.18146718, 37.85, -122.25],
+    [1.9, 20.0, 4.5, 1.1, 1500.0, 3.2, 34.05, -118.24],
+])
+
+# per-stage timers and batch sizes, children resolved once to keep the hot path cheap
+_PARSE_TIMER = metrics.STAGE_LATENCY.labels("parse")
+_INDEX_TIMER = metrics.STAGE_LATENCY.labels("index")
+_CACHE_KEY_TIMER = metrics.STAGE_LATENCY.labels("cache_key")
+_CACHE_READ_TIMER = metrics.STAGE_LATENCY.labels("cache_read")
+_PREDICT_TIMER = metrics.STAGE_LATENCY.labels("predict")
+_CACHE_WRITE_TIMER = metrics.STAGE_LATENCY.labels("cache_write")
+_REQUEST_ROWS = metrics.BATCH_SIZE.labels("request")
+_MODEL_ROWS = metrics.BATCH_SIZE.labels("model")
+
+CACHE_LOOKUPS = metrics.counter(
+    "prediction_cache_lookups_total", "Rows served from cache (hit) or sent to the model (miss)", ["endpoint", "result"]
+)
+CACHE_LAYER_LOOKUPS = metrics.counter(
+    "prediction_cache_layer_lookups_total", "Lookups per cache layer", ["layer", "result"]
+)
+CACHE_REDIS_BYPASSED = metrics.gauge(
+    "prediction_cache_redis_bypassed", "1 while the circuit breaker skips Redis"
+)
+INFERENCE_IN_FLIGHT = metrics.gauge(
+    "inference_in_flight", "Model calls running or waiting in the inference pool"
+)
+INDEX_LOOKUPS = metrics.counter(
+    "prediction_index_lookups_total", "Rows answered by the precomputed prediction index", ["result"]
+)
+
+def _collect_metrics() -> None:
+    # copies counters kept by the cache and the inference pool at scrape time
+    for endpoint, (hits, misses) in prediction_cache.endpoint_lookups.items():
+        CACHE_LOOKUPS.labels(endpoint, "hit").set(hits)
+        CACHE_LOOKUPS.labels(endpoint, "miss").set(misses)
+    CACHE_LAYER_LOOKUPS.labels("l1", "hit").set(prediction_cache.l1.hits)
+    CACHE_LAYER_LOOKUPS.labels("l1", "miss").set(prediction_cache.l1.misses)
+    CACHE_LAYER_LOOKUPS.labels("redis", "hit").set(prediction_cache.redis_hits)
+    CACHE_LAYER_LOOKUPS.labels("redis", "miss").set(prediction_cache.redis_misses)
+    CACHE_REDIS_BYPASSED.labels().set(prediction_cache.breaker.state != "closed")
+    INFERENCE_IN_FLIGHT.labels().set(inference.pool.in_flight)
+    if grid_index is not None:
+        INDEX_LOOKUPS.labels("hit").set(grid_index.hits)
+        INDEX_LOOKUPS.labels("miss").set(grid_index.misses)
+
+metrics.collectors.append(_collect_metrics)
+
+STARTUP_SECONDS = metrics.gauge(
+    "startup_phase_seconds",
+    "Startup cost per phase; imports is the CPU time spent before the lifespan started",
+    ["phase"],
+)
 
 
 @asynccontextmanager
 async def lifespan_mechanism(app: FastAPI):
     logging.info("Starting up Lab3 API")
+    # CPU time so far is almost all module imports
+    timings = {"imports": time.process_time()}
+    started = phase_started = time.perf_counter()
 
-    # Load the Model on Startup
-    global model
-    model = load("model_pipeline.pkl")
+    # Load the Model on Startup, unless the pre-fork parent already did
+    global model, grid_index
+    fingerprint = model_version(MODEL_PATH)
+    # a worker restarted after MODEL_PATH changed must not serve the parent's old copy
+    if preloaded_model is not None and preloaded_fingerprint == fingerprint:
+        model = preloaded_model
+    else:
+        model = load_model(MODEL_PATH)
+    if prediction_index.PREDICTION_INDEX_PATH:
+        grid_index = prediction_index.load_index(prediction_index.PREDICTION_INDEX_PATH, fingerprint)
+    timings["model_load"] = time.perf_counter() - phase_started
+    phase_started = time.perf_counter()
+    inference.pool.start(MODEL_PATH)
+    timings["inference_pool"] = time.perf_counter() - phase_started
+    phase_started = time.perf_counter()
 
     # Load the Redis Cache
     HOST_URL = os.getenv("REDIS_URL", LOCAL_REDIS_URL)
-    redis = asyncio.from_url(HOST_URL, encoding="utf8", decode_responses=True)
+    redis = prediction_cache.connect(HOST_URL)
 
     # We initialize the connection to Redis and declare that all keys in the
     # database will be prefixed with w255-cache-predict. Do not change this
     # prefix for the submission.
     FastAPICache.init(RedisBackend(redis), prefix="w255-cache-prediction")
+    version = MODEL_VERSION or fingerprint
+    prediction_cache.init(redis, "w255-cache-prediction", version)
+    model_registry.serving(MODEL_PATH, version, fingerprint)
+    logging.info("Serving model version %s", version)
+    watcher = aio.ensure_future(model_registry.watch(MODEL_RELOAD_INTERVAL_SECONDS)) if MODEL_RELOAD_INTERVAL_SECONDS else None
+    primary = worker_number == 0
+    cleanup = aio.ensure_future(prediction_cache.purge_other_versions()) if primary else None
+    monitor = aio.ensure_future(prediction_cache.monitor_redis()) if primary else None
+    warm_up = aio.ensure_future(warmup.run(warmup.WARMUP_PATHS, multi_predict)) if primary and warmup.WARMUP_PATHS else None
+    timings["cache_init"] = time.perf_counter() - phase_started
+    timings["lifespan"] = time.perf_counter() - started
+    for phase, seconds in timings.items():
+        STARTUP_SECONDS.labels(phase).set(seconds)
+    logging.info("Startup timings (s): %s", ", ".join(f"{phase}={seconds:.3f}" for phase, seconds in timings.items()))
 
     yield
     logging.info("Shutting down Lab3 API")
+    for task in (cleanup, monitor, watcher, warm_up):
+        if task is not None:
+            task.cancel()
+    if primary:
+        warmup.save_recent()
+    inference.pool.shutdown()
+
+def preload_model() -> None:
+    # called before forking workers so they all share the parent's copy
+    global preloaded_model, preloaded_fingerprint
+    preloaded_fingerprint = model_version(MODEL_PATH)
+    preloaded_model = load_model(MODEL_PATH)
+
+def validate_model(candidate: Any) -> None:
+    predictions = np.asarray(candidate.predict(VALIDATION_HOUSES))
+    if predictions.shape != (len(VALIDATION_HOUSES),) or not np.isfinite(predictions).all():
+        raise ValueError(f"Model gives invalid predictions for the validation houses: {predictions!r}")
+
+class ModelRegistry:
+    """Hot reload of MODEL_PATH: load and validate in the background, then swap.
+
+    The old model keeps serving until the new one has passed validate_model();
+    the swap replaces the global model and the cache's model version in one
+    step of the event loop, so no request sees one without the other. Changes
+    are detected by the file's fingerprint, not the served version, which can
+    be pinned with MODEL_VERSION; a new file is served under its fingerprint.
+    """
+
+    def __init__(self):
+        self.path = ""
+        self.version = ""
+        self.fingerprint = ""
+        self.signature: Optional[tuple] = None
+        self.lock = aio.Lock()
+        self.tasks: set = set()
+
+    @staticmethod
+    def _signature(path: str) -> Optional[tuple]:
+        # compiled artifacts write model.json last, so it marks a complete update
+        if os.path.isdir(path):
+            path = os.path.join(path, "model.json")
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def serving(self, path: str, version: str, fingerprint: str) -> None:
+        self.path = path
+        self.version = version
+        self.fingerprint = fingerprint
+        self.signature = self._signature(path)
+
+    async def reload(self, path: Optional[str] = None) -> bool:
+        # True if a new model version is now served; raises, still serving the
+        # old one, if the new one does not load or validate
+        path = path or self.path
+        async with self.lock:
+            loop = aio.get_running_loop()
+            signature = self._signature(path)
+            version = await loop.run_in_executor(None, model_version, path)
+            if version == self.fingerprint:
+                self.signature = signature
+                return False
+            candidate = await loop.run_in_executor(None, load_model, path)
+            await loop.run_in_executor(None, validate_model, candidate)
+            # the index file is rebuilt for each model, an index for another one is dropped
+            candidate_index = await loop.run_in_executor(
+                None, prediction_index.load_index, prediction_index.PREDICTION_INDEX_PATH, version,
+            )
+            swap_model(candidate, path, version, candidate_index)
+            self.path, self.version, self.fingerprint, self.signature = path, version, version, signature
+        logger.info("Now serving model version %s from %s", version, path)
+        if worker_number == 0:
+            task = aio.ensure_future(prediction_cache.purge_other_versions())
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        return True
+
+    async def watch(self, interval: float) -> None:
+        while True:
+            await aio.sleep(interval)
+            signature = self._signature(self.path)
+            if signature is None or signature == self.signature:
+                continue
+            try:
+                await self.reload()
+            except aio.CancelledError:
+                raise
+            except Exception:
+                # retried once the file changes again
+                self.signature = signature
+                logger.exception("Model reload from %s failed, still serving %s", self.path, self.version)
+
+def swap_model(candidate: Any, path: str, version: str, candidate_index=None) -> None:
+    # no await in here: requests see either the old model and version or the new ones
+    global model, grid_index, model_generation
+    inference.pool.reload(path)
+    model = candidate
+    grid_index = candidate_index
+    model_generation += 1
+    prediction_cache.model_version = version
+
+model_registry = ModelRegistry()
 
 class House(BaseModel):
     """Data model to parse the request body JSON for a single house."""
@@ -66,20 +299,71 @@ class House(BaseModel):
             return v
         raise ValueError("Invalid value for Longitude")
 
-    def to_np(self) -> np.ndarray:
-        return np.array([
+    def features(self) -> tuple:
+        # feature order expected by the model pipeline
+        return (
             self.MedInc, self.HouseAge, self.AveRooms,
             self.AveBedrms, self.Population, self.AveOccup,
             self.Latitude, self.Longitude
-        ]).reshape(1,8)
+        )
+
+    def to_np(self) -> np.ndarray:
+        return np.array(self.features()).reshape(1,8)
+
+FEATURE_NAMES = tuple(House.model_fields)
+_get_features = itemgetter(*FEATURE_NAMES)
+_house_list = TypeAdapter(List[House])
+
+def invalid_feature_mask(matrix: np.ndarray) -> np.ndarray:
+    # vectorized House range rules, True where a value is rejected; the
+    # comparisons are negated so NaN is rejected like in House
+    invalid = np.zeros(matrix.shape, dtype=bool)
+    invalid[:, 0] = ~(matrix[:, 0] >= 0)
+    invalid[:, 6] = ~((matrix[:, 6] > -90) & (matrix[:, 6] < 90))
+    invalid[:, 7] = ~((matrix[:, 7] > -180) & (matrix[:, 7] < 180))
+    return invalid
+
+def houses_to_matrix(value: Any) -> np.ndarray:
+    with _PARSE_TIMER.time():
+        return _houses_to_matrix(value)
+
+def _houses_to_matrix(value: Any) -> np.ndarray:
+    # Bulk ingestion straight into a contiguous (n, 8) float64 matrix. Well
+    # formed payloads (lists of dicts with exactly the 8 House keys) are copied
+    # by C-level iteration and range checked with NumPy; anything else,
+    # including out-of-range values, goes through the House model so clients
+    # get the same 422 errors as before.
+    if isinstance(value, np.ndarray):
+        return value
+    if isinstance(value, list):
+        try:
+            if not value or set(map(len, value)) == {len(FEATURE_NAMES)}:
+                matrix = np.fromiter(
+                    chain.from_iterable(map(_get_features, value)),
+                    dtype=np.float64,
+                    count=len(value) * len(FEATURE_NAMES),
+                ).reshape(len(value), len(FEATURE_NAMES))
+                # None parses to NaN here, House decides what to make of non-finite values
+                if np.isfinite(matrix).all() and not invalid_feature_mask(matrix).any():
+                    return matrix
+        except (KeyError, TypeError, ValueError):
+            pass
+    houses = _house_list.validate_python(value)
+    return np.array([house.features() for house in houses], dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+
+HouseMatrix = Annotated[
+    np.ndarray,
+    BeforeValidator(houses_to_matrix),
+    WithJsonSchema({"type": "array", "items": House.model_json_schema()}),
+]
 
 class BulkHousePredictionRequest(BaseModel):
-    # data model for prediction requests
-    model_config = ConfigDict(extra="forbid")
-    houses: List[House]
+    # data model for prediction requests, houses are parsed into an (n, 8) matrix
+    model_config = ConfigDict(extra="forbid", arbitrary_types_allowed=True)
+    houses: HouseMatrix
 
-    def to_np(self):
-        return np.array([list(vars(house).values()) for house in self.houses])
+    def to_np(self) -> np.ndarray:
+        return self.houses
 
 class HousePrediction(BaseModel):
     model_config = ConfigDict(extra="forbid")
@@ -91,30 +375,354 @@ class BulkHousePrediction(BaseModel):
 
 sub_application_housing_predict = FastAPI(lifespan=lifespan_mechanism)
 
+@sub_application_housing_predict.exception_handler(InferenceOverloaded)
+async def inference_overloaded_handler(request: Request, exc: InferenceOverloaded):
+    # shed load instead of queueing without bound, clients should retry
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Prediction capacity exhausted, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+NON_FINITE_DETAIL = "The model could not predict a finite price for these features"
+
+@sub_application_housing_predict.exception_handler(prediction_cache.NonFinitePrediction)
+async def non_finite_prediction_handler(request: Request, exc: prediction_cache.NonFinitePrediction):
+    # infinite or extreme features can make the model answer NaN, which is
+    # not a JSON number; the house is rejected rather than the value served
+    return JSONResponse(
+        status_code=422,
+        content={"detail": NON_FINITE_DETAIL},
+    )
+
 # Do not change this function name.
 # See the Input Vectorization subsection in the readme for more instructions
-async def multi_predict(houses_data: List[House]) -> List[float]:
+async def multi_predict(houses_data: Union[List[House], np.ndarray]) -> List[float]:
     # vectorized predictions on multiple house inputs, returns ist of predicted house prices
-    if not houses_data:
+    if len(houses_data) == 0:
         return []
-    
-    # converting to array for vectorized prediction
-    request = BulkHousePredictionRequest(houses=houses_data)
-    input_matrix = request.to_np()
 
-    return model.predict(input_matrix).tolist()
+    # converting to array for vectorized prediction, houses are already validated
+    if isinstance(houses_data, np.ndarray):
+        input_matrix = houses_data
+    else:
+        input_matrix = np.array([house.features() for house in houses_data], dtype=np.float64)
+
+    predictions = await predict_matrix(input_matrix)
+    return predictions.tolist()
+
+async def predict_matrix(input_matrix: np.ndarray) -> np.ndarray:
+    # runs in the inference pool so large batches do not block the event loop
+    _MODEL_ROWS.observe(len(input_matrix))
+    with _PREDICT_TIMER.time():
+        return await inference.pool.predict(model, input_matrix)
+
+async def _predict_rows(rows: List[np.ndarray]) -> List[float]:
+    return await multi_predict(np.vstack(rows))
+
+predict_batcher = MicroBatcher(_predict_rows, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+
+async def cached_multi_predict_json(
+    input_matrix: np.ndarray,
+    predict_fn: Optional[Callable[[np.ndarray], Awaitable[List[float]]]] = None,
+    endpoint: str = "bulk-predict",
+) -> List[str]:
+    # rows in the precomputed index are answered from it, the rest go through
+    # the cache; predictions are returned as the JSON number text stored in the
+    # cache so responses can be assembled without decoding and re-encoding them
+    _REQUEST_ROWS.observe(len(input_matrix))
+    served_index = grid_index
+    if served_index is None:
+        return await _cached_predict_json(input_matrix, predict_fn, endpoint)
+    with _INDEX_TIMER.time():
+        values, found = served_index.lookup(input_matrix)
+    if not found.any():
+        return await _cached_predict_json(input_matrix, predict_fn, endpoint)
+    exact = iter(await _cached_predict_json(input_matrix[~found], predict_fn, endpoint) if not found.all() else ())
+    return [
+        prediction_cache.to_token(value) if hit else next(exact)
+        for value, hit in zip(values.tolist(), found.tolist())
+    ]
+
+async def _cached_predict_json(
+    input_matrix: np.ndarray,
+    predict_fn: Optional[Callable[[np.ndarray], Awaitable[List[float]]]],
+    endpoint: str,
+) -> List[str]:
+    # per-house cache lookup, only the rows that miss are sent to the model
+    generation = model_generation
+    with _CACHE_KEY_TIMER.time():
+        keys = [prediction_cache.feature_key(row) for row in input_matrix.tolist()]
+    with _CACHE_READ_TIMER.time():
+        predictions, stale = await prediction_cache.get_many(keys)
+    if stale:
+        _schedule_refresh([keys[i] for i in stale], input_matrix[stale], generation)
+
+    # identical houses within a batch share one key and are predicted once
+    missing: dict = {}
+    for i, value in enumerate(predictions):
+        if value is None:
+            missing.setdefault(keys[i], []).append(i)
+    misses = sum(map(len, missing.values()))
+    prediction_cache.record_lookups(endpoint, len(keys) - misses, misses)
+    if not missing:
+        return predictions
+
+    # single-flight: keys another request in this process is already
+    # computing are awaited rather than recomputed
+    values = {}
+    pending = list(missing)
+    while pending:
+        owned, waiting = prediction_cache.single_flight.claim(pending)
+        try:
+            computed = {}
+            if owned:
+                computed = await _compute_owned(owned, input_matrix, missing, predict_fn or multi_predict, generation)
+        except Exception as e:
+            prediction_cache.single_flight.fail(owned, e)
+            raise
+        except BaseException:
+            # cancelled (client gone): waiters compute these keys themselves
+            prediction_cache.single_flight.abandon(owned)
+            raise
+        prediction_cache.single_flight.resolve(computed)
+        values.update(computed)
+        # shielded, so this request being cancelled does not cancel the owner's futures
+        results = await aio.gather(*map(aio.shield, waiting.values())) if waiting else []
+        values.update((key, value) for key, value in zip(waiting, results) if value is not None)
+        pending = [key for key, value in zip(waiting, results) if value is None]
+
+    for key, indices in missing.items():
+        for i in indices:
+            predictions[i] = values[key]
+    return predictions
+
+async def _compute_owned(owned: List[bytes], input_matrix: np.ndarray, missing: dict, predict_fn, generation: int) -> dict:
+    # with the Redis lock enabled, keys another replica is recomputing are
+    # picked up from Redis once it writes them back
+    locked = await prediction_cache.acquire_locks(owned)
+    values = {}
+    others = [key for key, won in zip(owned, locked) if not won]
+    if others:
+        values.update(await prediction_cache.wait_for_values(others))
+    to_compute = [key for key in owned if key not in values]
+    if to_compute:
+        rows = input_matrix[[missing[key][0] for key in to_compute]]
+        fresh = await predict_fn(rows)
+        computed = dict(zip(to_compute, map(prediction_cache.to_token, fresh)))
+        warmup.record(rows)
+        if generation != model_generation:
+            computed_cacheable = {}  # the model was swapped while these were computed
+        else:
+            computed_cacheable = computed
+        with _CACHE_WRITE_TIMER.time():
+            await prediction_cache.set_many(computed_cacheable, unlock=[key for key, won in zip(owned, locked) if won])
+        values.update(computed)
+    return values
+
+# keys being recomputed in the background for stale-while-revalidate
+_refreshing: set = set()
+_refresh_tasks: set = set()
+
+def _schedule_refresh(keys: List[bytes], rows: np.ndarray, generation: int) -> None:
+    todo = {}
+    for i, key in enumerate(keys):
+        if key not in _refreshing:
+            todo.setdefault(key, i)
+    if not todo:
+        return
+    _refreshing.update(todo)
+    task = aio.ensure_future(_refresh(list(todo), rows[list(todo.values())], generation))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+async def _refresh(keys: List[bytes], rows: np.ndarray, generation: int) -> None:
+    try:
+        fresh = await multi_predict(rows)
+        if generation != model_generation:
+            return
+        await prediction_cache.set_many(dict(zip(keys, map(prediction_cache.to_token, fresh))))
+    except Exception:
+        logger.warning("Background refresh of %d stale predictions failed", len(keys), exc_info=True)
+    finally:
+        _refreshing.difference_update(keys)
+
+def _version_header(version: str) -> dict:
+    # the model version serving when the request started, a reload may land mid-request
+    return {"X-Model-Version": version}
+
+def _json_response(body: str, version: str) -> Response:
+    # pre-serialized body, bypasses response_model validation and re-encoding
+    return Response(content=body, media_type="application/json", headers=_version_header(version))
 
 @sub_application_housing_predict.post("/predict", response_model=HousePrediction)
-@cache(expire=3600)
-async def predict(house: House) -> HousePrediction:
-    predictions = await multi_predict([house])
-    return HousePrediction(prediction=predictions[0])
+async def predict(house: House) -> Response:
+    version = prediction_cache.model_version
+    predictions = await cached_multi_predict_json(house.to_np(), predict_batcher.submit_many, "predict")
+    return _json_response('{"prediction":' + predictions[0] + "}", version)
 
 @sub_application_housing_predict.post("/bulk-predict", response_model=BulkHousePrediction)
-@cache(expire=3600)
-async def bulk_predict(request_data: BulkHousePredictionRequest) -> BulkHousePrediction:
-	predictions = await multi_predict(request_data.houses)
-	return BulkHousePrediction(predictions=predictions)
+async def bulk_predict(request_data: BulkHousePredictionRequest) -> Response:
+    version = prediction_cache.model_version
+    predictions = await cached_multi_predict_json(request_data.to_np())
+    return _json_response('{"predictions":[' + ",".join(predictions) + "]}", version)
+
+COLUMNAR_JSON = "application/json"
+COLUMNAR_RAW = "application/octet-stream"
+COLUMNAR_NPY = "application/x-npy"
+
+def _columnar_error(loc: list, msg: str) -> HTTPException:
+    return HTTPException(status_code=422, detail=[{"loc": ["body"] + loc, "msg": msg, "type": "value_error"}])
+
+def parse_columnar(body: bytes, content_type: str) -> np.ndarray:
+    # decode a columnar/binary payload into a validated (n, 8) float64 matrix
+    if content_type == COLUMNAR_JSON:
+        try:
+            columns = json.loads(body)
+        except ValueError:
+            raise _columnar_error([], "Body is not valid JSON")
+        if not isinstance(columns, dict) or set(columns) != set(FEATURE_NAMES):
+            raise _columnar_error([], f"Expected an object with exactly the columns {list(FEATURE_NAMES)}")
+        rows = columns[FEATURE_NAMES[0]]
+        rows = len(rows) if isinstance(rows, list) else -1
+        matrix = np.empty((max(rows, 0), len(FEATURE_NAMES)), dtype=np.float64)
+        for j, name in enumerate(FEATURE_NAMES):
+            column = columns[name]
+            # checked explicitly: NumPy would broadcast a scalar or length-1
+            # column over every row and turn null into NaN
+            if not isinstance(column, list) or len(column) != rows or None in column:
+                raise _columnar_error([name], "Columns must be numeric arrays of equal length")
+            try:
+                matrix[:, j] = np.asarray(column, dtype=np.float64)
+            except (TypeError, ValueError):
+                raise _columnar_error([name], "Columns must be numeric arrays of equal length")
+    elif content_type == COLUMNAR_RAW:
+        if len(body) % (8 * len(FEATURE_NAMES)):
+            raise _columnar_error([], f"Raw body must be rows of {len(FEATURE_NAMES)} little-endian float64 values")
+        matrix = np.frombuffer(body, dtype="<f8").reshape(-1, len(FEATURE_NAMES))
+    elif content_type == COLUMNAR_NPY:
+        try:
+            matrix = np.load(io.BytesIO(body), allow_pickle=False)
+        except ValueError:
+            raise _columnar_error([], "Body is not a valid .npy array")
+        if matrix.ndim != 2 or matrix.shape[1] != len(FEATURE_NAMES) or matrix.dtype.kind not in "iuf":
+            raise _columnar_error([], f"Expected a numeric (n, {len(FEATURE_NAMES)}) array, got {matrix.dtype} {matrix.shape}")
+        matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Unsupported content type, use one of {COLUMNAR_JSON}, {COLUMNAR_RAW}, {COLUMNAR_NPY}",
+        )
+
+    invalid = invalid_feature_mask(matrix)
+    if invalid.any():
+        rows, cols = np.nonzero(invalid)
+        raise HTTPException(status_code=422, detail=[
+            {"loc": ["body", FEATURE_NAMES[col], int(row)], "msg": f"Invalid value for {FEATURE_NAMES[col]}", "type": "value_error"}
+            for row, col in zip(rows[:10], cols[:10])
+        ])
+    return matrix
+
+@sub_application_housing_predict.post(
+    "/bulk-predict-columnar",
+    openapi_extra={"requestBody": {"required": True, "content": {
+        COLUMNAR_JSON: {"schema": {
+            "type": "object",
+            "properties": {name: {"type": "array", "items": {"type": "number"}} for name in FEATURE_NAMES},
+            "required": list(FEATURE_NAMES),
+        }},
+        COLUMNAR_RAW: {"schema": {"type": "string", "format": "binary"}},
+        COLUMNAR_NPY: {"schema": {"type": "string", "format": "binary"}},
+    }}},
+)
+async def bulk_predict_columnar(request: Request) -> Response:
+    # Offline scoring path: one column per feature (JSON), or row-major
+    # little-endian float64 rows (raw or .npy) in FEATURE_NAMES order. Answers
+    # in the request's format and skips the per-house cache, which would only
+    # add key overhead for one-off batches of millions of rows.
+    version = prediction_cache.model_version
+    content_type = request.headers.get("content-type", COLUMNAR_JSON).split(";")[0].strip()
+    matrix = parse_columnar(await request.body(), content_type)
+    predictions = await predict_matrix(matrix) if len(matrix) else np.empty(0)
+    if not np.isfinite(predictions).all():
+        raise prediction_cache.NonFinitePrediction(f"Model predicted {predictions[~np.isfinite(predictions)][0]}")
+
+    if content_type == COLUMNAR_RAW:
+        return Response(predictions.astype("<f8").tobytes(), media_type=COLUMNAR_RAW, headers=_version_header(version))
+    if content_type == COLUMNAR_NPY:
+        buffer = io.BytesIO()
+        np.save(buffer, predictions.astype("<f8"))
+        return Response(buffer.getvalue(), media_type=COLUMNAR_NPY, headers=_version_header(version))
+    return _json_response('{"predictions":[' + ",".join(map(repr, predictions.tolist())) + "]}", version)
+
+async def ndjson_chunks(stream: AsyncIterator[bytes], chunk_rows: int) -> AsyncIterator[Tuple[List[int], list]]:
+    # parse newline-delimited JSON incrementally, yielding (line numbers, rows)
+    # with at most chunk_rows rows so memory does not grow with the body
+    buffer = b""
+    line_numbers: List[int] = []
+    rows: list = []
+    line_number = 0
+    async for data in stream:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                line_numbers.append(line_number)
+                rows.append(_parse_ndjson_line(line, line_number))
+            if len(rows) == chunk_rows:
+                yield line_numbers, rows
+                line_numbers, rows = [], []
+    if buffer.strip():
+        line_numbers.append(line_number + 1)
+        rows.append(_parse_ndjson_line(buffer, line_number + 1))
+    if rows:
+        yield line_numbers, rows
+
+def _parse_ndjson_line(line: bytes, line_number: int) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=[
+            {"loc": ["body", line_number], "msg": "Line is not valid JSON", "type": "json_invalid"}
+        ])
+
+async def _predict_ndjson_chunk(line_numbers: List[int], rows: list) -> str:
+    try:
+        matrix = houses_to_matrix(rows)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=[
+            {"loc": ["body", line_numbers[error["loc"][0]], *error["loc"][1:]],
+             "msg": error["msg"], "type": error["type"]}
+            for error in e.errors()
+        ])
+    predictions = await cached_multi_predict_json(matrix, endpoint="bulk-predict-stream")
+    return "".join('{"prediction":' + value + "}\n" for value in predictions)
+
+@sub_application_housing_predict.post("/bulk-predict-stream")
+async def bulk_predict_stream(request: Request) -> StreamingResponse:
+    # One house per line in, one {"prediction": ...} per line out, scored in
+    # STREAM_CHUNK_ROWS chunks. The first chunk is scored before the response
+    # starts so a malformed request still gets a 422; once streaming, errors
+    # are reported as a final {"error": ...} line.
+    version = prediction_cache.model_version
+    chunks = ndjson_chunks(request.stream(), STREAM_CHUNK_ROWS)
+    first_chunk = await anext(chunks, None)
+    first_output = await _predict_ndjson_chunk(*first_chunk) if first_chunk else ""
+
+    async def body() -> AsyncIterator[str]:
+        yield first_output
+        try:
+            async for chunk in chunks:
+                yield await _predict_ndjson_chunk(*chunk)
+        except HTTPException as e:
+            yield json.dumps({"error": e.detail}) + "\n"
+        except InferenceOverloaded:
+            yield json.dumps({"error": "Prediction capacity exhausted, retry shortly"}) + "\n"
+        except prediction_cache.NonFinitePrediction:
+            yield json.dumps({"error": NON_FINITE_DETAIL}) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=_version_header(version))
 
 @sub_application_housing_predict.get("/hello")
 async def hello(name: str):
@@ -123,3 +731,35 @@ async def hello(name: str):
 @sub_application_housing_predict.get("/health")
 async def health():
     return {"time": datetime.now()}
+
+@sub_application_housing_predict.get("/ready")
+async def ready():
+    # readiness is held while the startup cache warm-up is below its target
+    if not warmup.ready():
+        return JSONResponse(status_code=503, content={"warmup_progress": warmup.current_progress()})
+    return {"warmup_progress": warmup.current_progress()}
+
+@sub_application_housing_predict.get("/cache-stats")
+async def cache_stats():
+    stats = prediction_cache.stats()
+    stats["index"] = grid_index.stats() if grid_index is not None else None
+    return stats
+
+@sub_application_housing_predict.post("/admin/reload-model", include_in_schema=False)
+async def reload_model(authorization: str = Header("")):
+    # only ever reloads MODEL_PATH: unpickling a caller-chosen file would run its code
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(authorization.encode(), ("Bearer " + MODEL_ADMIN_TOKEN).encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if worker_count > 1:
+        raise HTTPException(status_code=409, detail=(
+            f"Serving with {worker_count} workers, a reload would only reach one of them; "
+            "set MODEL_RELOAD_INTERVAL_SECONDS so every worker picks up a new MODEL_PATH"
+        ))
+    try:
+        reloaded = await model_registry.reload()
+    except Exception as e:
+        logger.exception("Model reload from %s failed", model_registry.path)
+        raise HTTPException(status_code=422, detail=f"Model not reloaded, still serving {model_registry.version}: {e}")
+    return {"model_version": model_registry.version, "reloaded": reloaded}
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Optional
+
+import numpy as np
+
+from src.svr_engine import load_model
+
+logger = logging.getLogger(__name__)
+
+# "thread" relies on numpy/sklearn releasing the GIL inside the kernel
+# computation, "process" loads a private copy of the model in every worker
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+# predictions allowed to wait for a free worker before callers get a 503
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "32"))
+
+
+class InferenceOverloaded(Exception):
+    """Raised when the inference queue is full and the request should be shed."""
+
+
+# model loaded by each process-pool worker in its initializer
+_worker_model = None
+
+
+def _load_worker_model(model_path: str) -> None:
+    global _worker_model
+    _worker_model = load_model(model_path)
+
+
+def _worker_predict(matrix: np.ndarray) -> np.ndarray:
+    return _worker_model.predict(matrix)
+
+
+class InferencePool:
+    """Runs model.predict off the event loop with a bounded number of waiters."""
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor: Optional[Executor] = None
+        self.in_flight = 0
+
+    def start(self, model_path: str) -> None:
+        if self.kind == "process":
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_load_worker_model,
+                initargs=(model_path,),
+            )
+        elif self.kind == "thread":
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="inference"
+            )
+        else:
+            raise ValueError(f"Unknown INFERENCE_EXECUTOR: {self.kind}")
+        logger.info("Started %s inference pool with %d workers", self.kind, self.workers)
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def reload(self, model_path: str) -> None:
+        # process workers hold their own copy of the model: start a new pool and
+        # let the old one finish the predictions already submitted to it
+        if self.kind != "process" or self.executor is None:
+            return
+        old = self.executor
+        self.start(model_path)
+        old.shutdown(wait=False)
+
+    async def predict(self, model: Any, matrix: np.ndarray) -> np.ndarray:
+        # outside of the API lifespan (scripts, direct calls) predict inline
+        if self.executor is None:
+            return model.predict(matrix)
+        if self.in_flight >= self.workers + self.max_queue:
+            raise InferenceOverloaded(
+                f"{self.in_flight} predictions already running or queued"
+            )
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            if self.kind == "process":
+                return await loop.run_in_executor(self.executor, _worker_predict, matrix)
+            return await loop.run_in_executor(self.executor, model.predict, matrix)
+        finally:
+            self.in_flight -= 1
+
+
+pool = InferencePool(INFERENCE_EXECUTOR, INFERENCE_WORKERS, INFERENCE_MAX_QUEUE)
@@ -1,7 +1,9 @@
 from contextlib import AsyncExitStack
 
 from fastapi import FastAPI
+from fastapi.responses import Response
 
+from src import metrics
 from src.housing_predict import lifespan_mechanism, sub_application_housing_predict
 
 
@@ -20,5 +22,16 @@ app = FastAPI(lifespan=main_lifespan)
 app.mount("/lab", sub_application_housing_predict)
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+app.add_middleware(
+    metrics.MetricsMiddleware,
+    paths=["/metrics"] + ["/lab" + route.path for route in sub_application_housing_predict.routes],
+)
+
+
 # /docs endpoint is defined by FastAPI automatically
 # /openapi.json returns a json object automatically by FastAPI
@@ -0,0 +1,166 @@
+# Minimal Prometheus instrumentation: counters, gauges and histograms rendered
+# in the text exposition format by /metrics. Hot-path updates are a dict
+# lookup and a few additions; values that other modules already count (cache
+# hits, inference queue, ...) are copied in by collectors at scrape time.
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536, 262144)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: "_Histogram"):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # one slot per bound plus +Inf, made cumulative when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Metric:
+    """A metric family; labels() returns the child holding one label combination."""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str] = (), buckets=None):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets is not None else None
+        self.children: Dict[Tuple[str, ...], object] = {}
+        registry.append(self)
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = _Histogram(self.buckets) if self.kind == "histogram" else _Value()
+            self.children[values] = child
+        return child
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in sorted(self.children.items()):
+            labels = [f'{name}="{value}"' for name, value in zip(self.labelnames, values)]
+            if self.kind != "histogram":
+                yield f"{self.name}{_braces(labels)} {_number(child.value)}"
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_braces(labels + [le])} {cumulative}"
+            yield f"{self.name}_sum{_braces(labels)} {_number(child.sum)}"
+            yield f"{self.name}_count{_braces(labels)} {cumulative}"
+
+
+def _braces(labels: List[str]) -> str:
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def _number(value: float) -> str:
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry: List[Metric] = []
+# called before every render to copy in values counted elsewhere
+collectors: List[Callable[[], None]] = []
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+    return Metric(name, documentation, "counter", labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+    return Metric(name, documentation, "gauge", labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Metric:
+    return Metric(name, documentation, "histogram", labelnames, buckets)
+
+
+def render() -> str:
+    for collect in collectors:
+        collect()
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+REQUEST_LATENCY = histogram(
+    "http_request_duration_seconds", "Time from request received to response sent, including validation", ["path"]
+)
+REQUESTS_IN_FLIGHT = gauge("http_requests_in_flight", "Requests currently being served")
+STAGE_LATENCY = histogram(
+    "prediction_stage_duration_seconds",
+    "Time spent per prediction stage: parse (JSON rows to validated matrix), index (precomputed "
+    "prediction lookup), cache_key, cache_read, predict (model call), cache_write",
+    ["stage"],
+)
+BATCH_SIZE = histogram(
+    "prediction_batch_rows", "Rows per request (source=request) and per model call (source=model)",
+    ["source"], BATCH_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per known path and the in-flight gauge."""
+
+    def __init__(self, app, paths: Iterable[str] = ()):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        # unknown paths share one label so scanners cannot blow up cardinality
+        path = scope["path"] if scope["path"] in self.paths else "other"
+        in_flight = REQUESTS_IN_FLIGHT.labels()
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(path).observe(time.perf_counter() - start)
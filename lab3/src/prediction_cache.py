@@ -0,0 +1,591 @@
+import asyncio as aio
+import hashlib
+import logging
+import math
+import os
+import random
+import struct
+import sys
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from redis import asyncio
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# "ttl": entries expire after a jittered CACHE_EXPIRE_SECONDS.
+# "swr": stale-while-revalidate, past the (jittered) soft TTL an entry is still
+#   served for CACHE_STALE_SECONDS while the caller refreshes it in the background.
+# "persistent": no expiry; the model version in every key makes a new
+#   model_pipeline.pkl start from a fresh keyspace instead.
+CACHE_MODE = os.getenv("CACHE_MODE", "ttl")
+EXPIRE_SECONDS = int(os.getenv("CACHE_EXPIRE_SECONDS", "3600"))
+# TTLs are spread uniformly over +/- this fraction so keys filled together
+# do not all expire together
+TTL_JITTER = float(os.getenv("CACHE_TTL_JITTER", "0.1"))
+STALE_SECONDS = int(os.getenv("CACHE_STALE_SECONDS", "600"))
+
+# "binary": keys are the prefix, a 4-byte model version tag and the raw 16-byte
+#   feature digest; values are one packed little-endian float, CACHE_VALUE_DTYPE
+#   f8 (exact) or f4 (half the size, about 7 significant digits served).
+# "text": hex keys with the full model version and JSON number values, easy to
+#   inspect with redis-cli. Each encoding and dtype gets its own keyspace.
+CACHE_ENCODING = os.getenv("CACHE_ENCODING", "binary")
+CACHE_VALUE_DTYPE = os.getenv("CACHE_VALUE_DTYPE", "f8")
+
+# L1 sizing, 0 disables the corresponding bound (or the whole L1 for entries)
+L1_MAX_ENTRIES = int(os.getenv("L1_CACHE_MAX_ENTRIES", "10000"))
+L1_MAX_BYTES = int(os.getenv("L1_CACHE_MAX_BYTES", "0"))
+L1_TTL_SECONDS = int(os.getenv("L1_CACHE_TTL_SECONDS", str(EXPIRE_SECONDS)))
+
+# Cross-replica stampede protection: the replica that wins a short Redis lock
+# on a key recomputes it, the others poll for its result for up to
+# LOCK_WAIT_MS before computing it themselves
+REDIS_LOCK_ENABLED = os.getenv("SINGLE_FLIGHT_REDIS_LOCK", "0") == "1"
+LOCK_TTL_MS = int(os.getenv("SINGLE_FLIGHT_LOCK_TTL_MS", "2000"))
+LOCK_WAIT_MS = int(os.getenv("SINGLE_FLIGHT_LOCK_WAIT_MS", "500"))
+LOCK_POLL_MS = 20
+
+# on startup, keys from other model versions are removed in SCAN pages of
+# CLEANUP_BATCH keys so a model rollout does not need a FLUSHALL
+CLEANUP_OLD_VERSIONS = os.getenv("CACHE_CLEANUP_OLD_VERSIONS", "1") == "1"
+CLEANUP_BATCH = int(os.getenv("CACHE_CLEANUP_BATCH", "1000"))
+
+# Connection pool and timeouts: a slow or unreachable Redis must cost a request
+# at most a few milliseconds, after which it is computed as if uncached
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+REDIS_POOL_TIMEOUT_MS = int(os.getenv("REDIS_POOL_TIMEOUT_MS", "20"))
+REDIS_SOCKET_TIMEOUT_MS = int(os.getenv("REDIS_SOCKET_TIMEOUT_MS", "50"))
+REDIS_CONNECT_TIMEOUT_MS = int(os.getenv("REDIS_CONNECT_TIMEOUT_MS", "100"))
+# keys per MGET or pipeline: bulk requests and warm-up batches are split into
+# round trips that each fit in the socket timeout, instead of one that trips
+# the circuit breaker
+REDIS_BATCH_KEYS = int(os.getenv("REDIS_BATCH_KEYS", "1000"))
+# Redis has to evict at its memory limit rather than refuse writes or get
+# OOM-killed. With REDIS_CONFIGURE_EVICTION=1 the API sets REDIS_MAXMEMORY (if
+# given) and REDIS_EVICTION_POLICY through CONFIG SET, otherwise it only checks
+# them and warns. INFO is polled every CACHE_INFO_INTERVAL_SECONDS for /cache-stats.
+REDIS_CONFIGURE_EVICTION = os.getenv("REDIS_CONFIGURE_EVICTION", "0") == "1"
+REDIS_MAXMEMORY = os.getenv("REDIS_MAXMEMORY", "")
+REDIS_EVICTION_POLICY = os.getenv("REDIS_EVICTION_POLICY", "allkeys-lfu")
+CACHE_INFO_INTERVAL_SECONDS = float(os.getenv("CACHE_INFO_INTERVAL_SECONDS", "30"))
+
+# after BREAKER_FAILURES consecutive Redis errors the cache is bypassed
+# (L1 only) for BREAKER_RESET_SECONDS, then a single probe call is let through
+BREAKER_FAILURES = int(os.getenv("CACHE_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("CACHE_BREAKER_RESET_SECONDS", "5"))
+
+
+class LRUCache:
+    """Bounded in-process LRU with a per-entry TTL, used as L1 in front of Redis."""
+
+    def __init__(self, max_entries: int, max_bytes: int = 0, ttl: int = EXPIRE_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()  # key -> (deadline, value, size)
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: bytes) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: bytes, value: str) -> None:
+        if self.max_entries <= 0:
+            return
+        if key in self.entries:
+            self._remove(key)
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        self.entries[key] = (time.monotonic() + self.ttl, value, size)
+        self.size_bytes += size
+        while len(self.entries) > self.max_entries or (
+            self.max_bytes and self.size_bytes > self.max_bytes
+        ):
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.size_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.size_bytes,
+        }
+
+    def _remove(self, key: bytes) -> None:
+        _, _, size = self.entries.pop(key)
+        self.size_bytes -= size
+
+
+class SingleFlight:
+    """One in-flight computation per key inside this process, others await it."""
+
+    def __init__(self):
+        self.in_flight: Dict[bytes, aio.Future] = {}
+
+    def claim(self, keys: Iterable[bytes]) -> Tuple[List[bytes], Dict[bytes, aio.Future]]:
+        # split keys into the ones this caller now owns and must compute, and
+        # futures for the ones another caller is already computing
+        owned, waiting = [], {}
+        loop = aio.get_running_loop()
+        for key in keys:
+            future = self.in_flight.get(key)
+            if future is None:
+                future = loop.create_future()
+                # nobody may be waiting, retrieve the exception so asyncio
+                # does not log it as never retrieved
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self.in_flight[key] = future
+                owned.append(key)
+            else:
+                waiting[key] = future
+        return owned, waiting
+
+    def resolve(self, values: Dict[bytes, str]) -> None:
+        for key, value in values.items():
+            future = self.in_flight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(value)
+
+    def fail(self, keys: Iterable[bytes], exc: BaseException) -> None:
+        for key in keys:
+            future = self.in_flight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_exception(exc)
+
+    def abandon(self, keys: Iterable[bytes]) -> None:
+        # the owner went away without a value: waiters get None and claim the key again
+        for key in keys:
+            future = self.in_flight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(None)
+
+
+class CircuitBreaker:
+    """Skips Redis while it keeps failing so predictions never wait on it."""
+
+    def __init__(self, max_failures: int, reset_seconds: float):
+        self.max_failures = max_failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.probe_started = 0.0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.probing else "open"
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.reset_seconds:
+            return False
+        # a probe that never reported (its caller was cancelled before the
+        # round trip) is given up after another reset window
+        if self.probing and now - self.probe_started < self.reset_seconds:
+            return False
+        # let one call through; its outcome closes or re-opens the breaker
+        self.probing = True
+        self.probe_started = now
+        return True
+
+    def abandon_probe(self) -> None:
+        # the probe ended without an answer from Redis (cancelled, or a bug
+        # outside Redis): let the next call probe instead
+        self.probing = False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Redis is back, prediction cache re-enabled")
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probing or (self.opened_at is None and self.failures >= self.max_failures):
+            if not self.probing:
+                self.trips += 1
+                logger.warning("Redis keeps failing, bypassing the prediction cache for %ss", self.reset_seconds)
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+    def reset(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+
+
+def connect(url: str, max_connections: Optional[int] = None) -> asyncio.Redis:
+    # Blocking pool so a burst waits briefly for a free connection instead of
+    # opening unbounded sockets; every wait and read is bounded by a timeout
+    # that surfaces as a RedisError. Replies are bytes, values may be binary.
+    pool = asyncio.BlockingConnectionPool.from_url(
+        url,
+        max_connections=max_connections or REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT_MS / 1000,
+        socket_timeout=REDIS_SOCKET_TIMEOUT_MS / 1000,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT_MS / 1000,
+    )
+    return asyncio.Redis(connection_pool=pool)
+
+
+# Redis client, key prefix and model version, set once by the API lifespan via init()
+redis: Optional[asyncio.Redis] = None
+prefix = ""
+model_version = ""
+
+l1 = LRUCache(L1_MAX_ENTRIES, L1_MAX_BYTES, L1_TTL_SECONDS)
+single_flight = SingleFlight()
+breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_SECONDS)
+redis_hits = 0
+redis_misses = 0
+# endpoint -> [rows served from cache, rows that had to be predicted]
+endpoint_lookups: Dict[str, List[int]] = {}
+# memory, eviction and keyspace figures from the last INFO poll
+redis_info: dict = {}
+
+
+def init(client: asyncio.Redis, key_prefix: str, version: str) -> None:
+    global redis, prefix, model_version, redis_hits, redis_misses
+    redis = client
+    prefix = key_prefix
+    model_version = version
+    l1.clear()
+    breaker.reset()
+    redis_hits = redis_misses = 0
+    endpoint_lookups.clear()
+    redis_info.clear()
+
+
+def record_lookups(endpoint: str, hits: int, misses: int) -> None:
+    counts = endpoint_lookups.setdefault(endpoint, [0, 0])
+    counts[0] += hits
+    counts[1] += misses
+
+
+def stats() -> dict:
+    return {
+        "l1": l1.stats(),
+        "redis": {
+            "hits": redis_hits,
+            "misses": redis_misses,
+            "breaker": breaker.state,
+            "breaker_trips": breaker.trips,
+        },
+        "endpoints": {
+            endpoint: {"hits": hits, "misses": misses, "hit_ratio": hits / ((hits + misses) or 1)}
+            for endpoint, (hits, misses) in endpoint_lookups.items()
+        },
+        "redis_server": redis_info,
+    }
+
+
+def available() -> bool:
+    return redis is not None and breaker.allow()
+
+
+async def _call(method, *args, **kwargs):
+    # every cache round trip reports to the circuit breaker
+    try:
+        result = await method(*args, **kwargs)
+    except RedisError:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.abandon_probe()
+        raise
+    breaker.record_success()
+    return result
+
+
+@lru_cache(maxsize=16)
+def _key_head(key_prefix: str, version: str, encoding: str, dtype: str) -> bytes:
+    if encoding == "binary":
+        tag = hashlib.blake2b(f"{version}:{dtype}".encode(), digest_size=4).digest()
+        return f"{key_prefix}:".encode() + tag
+    return f"{key_prefix}:{version}:".encode()
+
+
+def key_head() -> bytes:
+    # common start of every key of the current model version and encoding
+    return _key_head(prefix, model_version, CACHE_ENCODING, CACHE_VALUE_DTYPE)
+
+
+def feature_key(features: Sequence[float]) -> bytes:
+    # Canonical key shared by /predict and /bulk-predict. The features are
+    # packed as little-endian float64 in model order, so 1 vs 1.0 or a
+    # reordered JSON body map to the same entry (adding 0.0 folds -0.0 into 0.0).
+    packed = struct.pack("<8d", *(float(value) + 0.0 for value in features))
+    digest = hashlib.blake2b(packed, digest_size=16)
+    if CACHE_ENCODING == "binary":
+        return key_head() + digest.digest()
+    return key_head() + digest.hexdigest().encode()
+
+
+def jittered_ttl(seconds: int) -> int:
+    return max(1, round(seconds * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)))
+
+
+_VALUE_STRUCTS = {"f8": struct.Struct("<d"), "f4": struct.Struct("<f")}
+_DEADLINE_STRUCT = struct.Struct("<I")
+
+
+class NonFinitePrediction(ValueError):
+    """Raised for a NaN or infinite prediction, which JSON cannot carry and must not be cached."""
+
+
+def to_token(prediction: float) -> str:
+    # JSON text of a prediction as it is served and cached; float32 values are
+    # rounded first so a miss answers exactly what later hits will
+    if not math.isfinite(prediction):
+        raise NonFinitePrediction(f"Model predicted {prediction}")
+    if CACHE_ENCODING == "binary" and CACHE_VALUE_DTYPE == "f4":
+        return str(np.float32(prediction))
+    return repr(float(prediction))
+
+
+def encode_value(token: str, soft_deadline: int = 0) -> bytes:
+    # soft_deadline (epoch seconds) is only stored in swr mode
+    if CACHE_ENCODING == "binary":
+        packed = _VALUE_STRUCTS[CACHE_VALUE_DTYPE].pack(float(token))
+        return packed + _DEADLINE_STRUCT.pack(soft_deadline) if soft_deadline else packed
+    return f"{token}@{soft_deadline}".encode() if soft_deadline else token.encode()
+
+
+def decode_value(value: bytes) -> Tuple[str, bool]:
+    # (JSON token, whether its swr soft deadline has passed)
+    if CACHE_ENCODING == "binary":
+        packed = _VALUE_STRUCTS[CACHE_VALUE_DTYPE]
+        (prediction,) = packed.unpack_from(value)
+        stale = len(value) > packed.size and _DEADLINE_STRUCT.unpack_from(value, packed.size)[0] <= time.time()
+        return to_token(prediction), stale
+    token, _, soft_deadline = value.decode().partition("@")
+    return token, bool(soft_deadline) and float(soft_deadline) <= time.time()
+
+
+async def _mget(keys: Sequence[bytes]) -> list:
+    values: list = []
+    for start in range(0, len(keys), REDIS_BATCH_KEYS):
+        values.extend(await _call(redis.mget, keys[start:start + REDIS_BATCH_KEYS]))
+    return values
+
+
+async def _pipelined(commands: List[tuple]) -> list:
+    # (method, args, kwargs) commands sent in pipelines of REDIS_BATCH_KEYS
+    results: list = []
+    for start in range(0, len(commands), REDIS_BATCH_KEYS):
+        pipe = redis.pipeline(transaction=False)
+        for method, args, kwargs in commands[start:start + REDIS_BATCH_KEYS]:
+            getattr(pipe, method)(*args, **kwargs)
+        results.extend(await _call(pipe.execute))
+    return results
+
+
+async def get_many(keys: Sequence[bytes]) -> Tuple[List[Optional[str]], List[int]]:
+    # L1 first, then MGET round trips for whatever L1 did not have.
+    # Values are the JSON number text of each prediction, misses are None.
+    # Also returns the positions served stale in swr mode, which the caller
+    # should refresh.
+    global redis_hits, redis_misses
+    results = [l1.get(key) for key in keys]
+    pending = [i for i, value in enumerate(results) if value is None]
+    stale: List[int] = []
+    if not pending or not available():
+        return results, stale
+    try:
+        values = await _mget([keys[i] for i in pending])
+    except RedisError as e:
+        logger.warning("Prediction cache read failed: %s", e)
+        return results, stale
+    for i, value in zip(pending, values):
+        if value is None:
+            redis_misses += 1
+            continue
+        redis_hits += 1
+        results[i], is_stale = decode_value(value)
+        if is_stale:
+            stale.append(i)
+        else:
+            l1.set(keys[i], results[i])
+    return results, stale
+
+
+async def set_many(items: Dict[bytes, str], unlock: Sequence[bytes] = ()) -> None:
+    # pipelined writes, one round trip per REDIS_BATCH_KEYS keys; expiry
+    # follows CACHE_MODE. Locks held on unlock are released in the same
+    # round trips.
+    for key, value in items.items():
+        l1.set(key, value)
+    if not (items or unlock) or not available():
+        return
+    commands = []
+    for key, value in items.items():
+        if CACHE_MODE == "persistent":
+            commands.append(("set", (key, encode_value(value)), {}))
+        elif CACHE_MODE == "swr":
+            soft_ttl = jittered_ttl(EXPIRE_SECONDS)
+            commands.append(("set", (key, encode_value(value, int(time.time()) + soft_ttl)), {"ex": soft_ttl + STALE_SECONDS}))
+        else:
+            commands.append(("set", (key, encode_value(value)), {"ex": jittered_ttl(EXPIRE_SECONDS)}))
+    if REDIS_LOCK_ENABLED and unlock:
+        lock_keys = [_lock_key(key) for key in unlock]
+        commands.extend(
+            ("delete", lock_keys[start:start + REDIS_BATCH_KEYS], {})
+            for start in range(0, len(lock_keys), REDIS_BATCH_KEYS)
+        )
+    try:
+        await _pipelined(commands)
+    except RedisError as e:
+        logger.warning("Prediction cache write failed: %s", e)
+
+
+def _lock_key(key: bytes) -> bytes:
+    return key + b":lock"
+
+
+async def acquire_locks(keys: Sequence[bytes]) -> List[bool]:
+    # SET NX PX per key, pipelined; True where this replica won the lock.
+    # Without Redis every lock is trivially ours.
+    if not REDIS_LOCK_ENABLED or not keys or not available():
+        return [True] * len(keys)
+    commands = [("set", (_lock_key(key), "1"), {"nx": True, "px": LOCK_TTL_MS}) for key in keys]
+    try:
+        return [bool(won) for won in await _pipelined(commands)]
+    except RedisError as e:
+        logger.warning("Prediction cache lock failed: %s", e)
+        return [True] * len(keys)
+
+
+async def wait_for_values(keys: Sequence[bytes]) -> Dict[bytes, str]:
+    # poll for values another replica is computing, returns whatever arrived
+    # within LOCK_WAIT_MS
+    found: Dict[bytes, str] = {}
+    pending = list(keys)
+    deadline = time.monotonic() + LOCK_WAIT_MS / 1000
+    while pending and time.monotonic() < deadline:
+        await aio.sleep(LOCK_POLL_MS / 1000)
+        if not available():
+            break
+        try:
+            values = await _mget(pending)
+        except RedisError as e:
+            logger.warning("Prediction cache read failed: %s", e)
+            break
+        for key, value in zip(pending, values):
+            if value is not None:
+                found[key] = decode_value(value)[0]
+                l1.set(key, found[key])
+        pending = [key for key in pending if key not in found]
+    return found
+
+
+async def purge_other_versions() -> int:
+    # Incrementally UNLINK keys under our prefix that belong to a different
+    # model version. Runs once per process start; replicas still on the old
+    # model lose their entries early during a rollout, which only costs misses.
+    if redis is None or not CLEANUP_OLD_VERSIONS:
+        return 0
+    current = key_head()
+    removed = 0
+    cursor = 0
+    try:
+        while True:
+            cursor, keys = await redis.scan(cursor, match=f"{prefix}:*", count=CLEANUP_BATCH)
+            old = [key for key in keys if not key.startswith(current)]
+            if old:
+                removed += await redis.unlink(*old)
+            if cursor == 0:
+                break
+            await aio.sleep(0)
+    except RedisError as e:
+        logger.warning("Old model version cleanup stopped: %s", e)
+    if removed:
+        logger.info("Removed %d cached predictions from other model versions", removed)
+    return removed
+
+
+async def check_eviction() -> Optional[dict]:
+    # returns the maxmemory settings in effect, None if they could not be read
+    if not available():
+        return None
+    try:
+        if REDIS_CONFIGURE_EVICTION:
+            if REDIS_MAXMEMORY:
+                await _call(redis.config_set, "maxmemory", REDIS_MAXMEMORY)
+            await _call(redis.config_set, "maxmemory-policy", REDIS_EVICTION_POLICY)
+        config = await _call(redis.config_get, "maxmemory*")
+    except RedisError as e:
+        logger.warning("Could not check the Redis eviction policy: %s", e)
+        return None
+    maxmemory = int(config.get("maxmemory", 0))
+    policy = config.get("maxmemory-policy", "noeviction")
+    # volatile-* policies never evict the TTL-less keys of persistent mode
+    if not maxmemory or policy == "noeviction" or (
+        CACHE_MODE == "persistent" and policy.startswith("volatile-")
+    ):
+        logger.warning(
+            "Redis maxmemory=%d maxmemory-policy=%s cannot evict cached predictions, "
+            "it will reject writes or be OOM-killed when full", maxmemory, policy,
+        )
+    return {"maxmemory": maxmemory, "maxmemory_policy": policy}
+
+
+async def refresh_info() -> None:
+    # one INFO round trip for the default sections (memory, stats, keyspace)
+    if not available():
+        return
+    try:
+        info = await _call(redis.info)
+    except RedisError as e:
+        logger.warning("Redis INFO failed: %s", e)
+        return
+    keys = sum(db.get("keys", 0) for name, db in info.items() if name.startswith("db"))
+    hits, misses = info.get("keyspace_hits", 0), info.get("keyspace_misses", 0)
+    redis_info.update(
+        used_memory=info.get("used_memory"),
+        maxmemory=info.get("maxmemory"),
+        maxmemory_policy=info.get("maxmemory_policy"),
+        keys=keys,
+        bytes_per_key=info.get("used_memory", 0) // keys if keys else None,
+        evicted_keys=info.get("evicted_keys"),
+        expired_keys=info.get("expired_keys"),
+        hit_ratio=hits / ((hits + misses) or 1),
+    )
+
+
+async def monitor_redis(interval: float = CACHE_INFO_INTERVAL_SECONDS) -> None:
+    # background task of the API lifespan
+    await check_eviction()
+    while True:
+        await refresh_info()
+        await aio.sleep(interval)
@@ -0,0 +1,140 @@
+# Precomputed predictions for a quantized feature grid.
+#
+# Each feature is cut into fixed-width bins (origin + k * step); a house falls
+# in the grid cell given by its 8 bin numbers. A dense 8-dimensional grid is far
+# too large to precompute, so the index only holds cells that contain observed
+# houses (training data, recorded traffic), built offline by trainer.build_index.
+# Every cell stores the model's prediction at its center and the largest
+# deviation from it measured at sample points inside the cell; cells whose
+# deviation is above the tolerance are not served. Lookups turn a matrix into
+# one int64 code per row and binary search the sorted codes, so rows outside
+# the index (or its bounds) fall back to the exact model.
+import logging
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# .npz written by trainer.build_index, empty to disable the index
+PREDICTION_INDEX_PATH = os.getenv("PREDICTION_INDEX_PATH", "")
+# largest measured deviation (in units of $100k) of a cell that is still served;
+# with trainer.build_index's default steps most occupied cells are within $5k
+PREDICTION_INDEX_TOLERANCE = float(os.getenv("PREDICTION_INDEX_TOLERANCE", "0.05"))
+
+
+class PredictionIndex:
+    """Sorted cell codes and their predictions for one model fingerprint."""
+
+    def __init__(
+        self,
+        origin: np.ndarray,
+        step: np.ndarray,
+        shape: np.ndarray,
+        codes: np.ndarray,
+        values: np.ndarray,
+        errors: np.ndarray,
+        fingerprint: str,
+    ):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.step = np.asarray(step, dtype=np.float64)
+        self.shape = np.asarray(shape, dtype=np.int64)
+        if float(np.prod(self.shape.astype(np.float64))) >= 2.0 ** 63:
+            raise ValueError(f"Grid of shape {self.shape.tolist()} has too many cells for int64 codes")
+        # mixed radix: the last feature varies fastest
+        self.strides = np.concatenate([np.cumprod(self.shape[:0:-1])[::-1], [1]]).astype(np.int64)
+        order = np.argsort(codes, kind="stable")
+        self.codes = np.asarray(codes, dtype=np.int64)[order]
+        self.values = np.asarray(values, dtype=np.float64)[order]
+        self.errors = np.asarray(errors, dtype=np.float32)[order]
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+
+    def cells(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # (bin numbers, rows inside the grid); NaN features are never inside
+        bins = np.floor((matrix - self.origin) / self.step)
+        with np.errstate(invalid="ignore"):
+            inside = ((bins >= 0) & (bins < self.shape)).all(axis=1)
+        return bins, inside
+
+    def encode(self, bins: np.ndarray) -> np.ndarray:
+        return bins.astype(np.int64) @ self.strides
+
+    def centers(self, codes: np.ndarray) -> np.ndarray:
+        bins = (codes[:, None] // self.strides) % self.shape
+        return self.origin + (bins + 0.5) * self.step
+
+    def lookup(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Predictions for the rows found in the index and the mask of those rows."""
+        values = np.full(len(matrix), np.nan)
+        found = np.zeros(len(matrix), dtype=bool)
+        bins, inside = self.cells(matrix)
+        if inside.any() and len(self.codes):
+            codes = self.encode(bins[inside])
+            positions = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+            matched = self.codes[positions] == codes
+            rows = np.flatnonzero(inside)[matched]
+            values[rows] = self.values[positions[matched]]
+            found[rows] = True
+        hits = int(found.sum())
+        self.hits += hits
+        self.misses += len(matrix) - hits
+        return values, found
+
+    def within(self, tolerance: float) -> "PredictionIndex":
+        keep = self.errors <= tolerance
+        return PredictionIndex(
+            self.origin, self.step, self.shape, self.codes[keep], self.values[keep], self.errors[keep],
+            self.fingerprint,
+        )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cells": len(self.codes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "max_error": float(self.errors.max()) if len(self.errors) else 0.0,
+        }
+
+    def save(self, path: str) -> None:
+        # plain arrays only, so loading never needs pickle
+        with open(path, "wb") as f:
+            np.savez(
+                f, origin=self.origin, step=self.step, shape=self.shape, codes=self.codes,
+                values=self.values, errors=self.errors, fingerprint=np.array(self.fingerprint),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "PredictionIndex":
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(
+                arrays["origin"], arrays["step"], arrays["shape"], arrays["codes"],
+                arrays["values"], arrays["errors"], str(arrays["fingerprint"]),
+            )
+
+
+def load_index(
+    path: str, fingerprint: str, tolerance: float = PREDICTION_INDEX_TOLERANCE
+) -> Optional[PredictionIndex]:
+    """The index at path restricted to tolerance, or None if it is missing or
+    was built for another model; serving then falls back to the model alone."""
+    if not path:
+        return None
+    try:
+        index = PredictionIndex.load(path)
+    except (OSError, KeyError, ValueError):
+        logger.exception("Could not load prediction index %s, predicting every row", path)
+        return None
+    if index.fingerprint != fingerprint:
+        logger.warning(
+            "Prediction index %s was built for model %s, not %s; predicting every row",
+            path, index.fingerprint, fingerprint,
+        )
+        return None
+    index = index.within(tolerance)
+    logger.info("Loaded prediction index %s with %d cells within %g", path, len(index.codes), tolerance)
+    return index
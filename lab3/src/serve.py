@@ -0,0 +1,183 @@
+# Pre-fork multi-worker server: python -m src.serve
+#
+# The parent imports the app and loads the model once, freezes the garbage
+# collector and forks WEB_WORKERS uvicorn workers that accept on one shared
+# listening socket. Workers inherit the model pages copy-on-write; gc.freeze()
+# moves every object that exists at fork time out of the collector's reach,
+# so collections in the workers do not write to (and un-share) those pages.
+# The parent restarts workers that die and forwards SIGTERM/SIGINT on shutdown.
+# A worker that keeps exiting soon after it starts (a bad MODEL_PATH, a broken
+# artifact) is restarted with a growing delay, and after WORKER_MAX_QUICK_EXITS
+# such exits in a row the parent stops and exits non-zero so the pod restarts.
+# Work needed once per pod (cache warm-up, purge, Redis monitoring) runs in
+# worker 0 only; the others read its warm-up progress for /lab/ready.
+import gc
+import logging
+import math
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import uvicorn
+from uvicorn.config import STARTUP_FAILURE
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# 0 means one worker per CPU available to the container
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))
+# Redis connection budget of the whole pod, split evenly across workers;
+# 0 keeps REDIS_MAX_CONNECTIONS per worker
+REDIS_MAX_CONNECTIONS_TOTAL = int(os.getenv("REDIS_MAX_CONNECTIONS_TOTAL", "0"))
+# a worker exiting within this many seconds of starting counts as a quick exit
+WORKER_MIN_UPTIME_SECONDS = float(os.getenv("WORKER_MIN_UPTIME_SECONDS", "30"))
+# consecutive quick exits of one worker before the whole server gives up
+WORKER_MAX_QUICK_EXITS = int(os.getenv("WORKER_MAX_QUICK_EXITS", "5"))
+# restart delay after the first quick exit, doubled after every further one
+WORKER_RESTART_DELAY_SECONDS = float(os.getenv("WORKER_RESTART_DELAY_SECONDS", "1"))
+WORKER_MAX_RESTART_DELAY_SECONDS = 30.0
+
+
+def available_cpus() -> int:
+    # the cgroup v2 CPU limit when there is one, else the CPUs we may run on
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+def redis_connections_per_worker(total: int, workers: int) -> int:
+    return max(1, total // workers)
+
+
+class WorkerRestarts:
+    """Restart delays for workers that keep exiting soon after they start."""
+
+    def __init__(self, min_uptime: float, max_quick_exits: int, delay: float, max_delay: float):
+        self.min_uptime = min_uptime
+        self.max_quick_exits = max_quick_exits
+        self.delay = delay
+        self.max_delay = max_delay
+        self.quick_exits: Dict[int, int] = {}  # worker number -> exits in a row
+
+    def record_exit(self, number: int, uptime: float) -> Optional[float]:
+        # seconds to wait before restarting the worker, None to give up
+        if uptime >= self.min_uptime:
+            self.quick_exits[number] = 0
+            return 0.0
+        quick_exits = self.quick_exits.get(number, 0) + 1
+        self.quick_exits[number] = quick_exits
+        if quick_exits >= self.max_quick_exits:
+            return None
+        return min(self.max_delay, self.delay * 2 ** (quick_exits - 1))
+
+
+def _run_worker(app, sock: Optional[socket.socket]) -> int:
+    # exit status of the worker; uvicorn exits with STARTUP_FAILURE when the
+    # lifespan startup fails
+    config = uvicorn.Config(app, lifespan="on", log_config=None)
+    server = uvicorn.Server(config)
+    try:
+        server.run(sockets=[sock] if sock is not None else None)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    return 0 if server.started else STARTUP_FAILURE
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+    workers = WEB_WORKERS or available_cpus()
+    # no collections while the long-lived objects are created, they are frozen below
+    gc.disable()
+
+    from src import housing_predict, prediction_cache, warmup
+    from src.main import app
+
+    housing_predict.preload_model()
+    housing_predict.worker_count = workers
+    if workers > 1:
+        warmup.share_progress()
+    if REDIS_MAX_CONNECTIONS_TOTAL:
+        prediction_cache.REDIS_MAX_CONNECTIONS = redis_connections_per_worker(REDIS_MAX_CONNECTIONS_TOTAL, workers)
+
+    sock = socket.create_server((HOST, PORT), backlog=2048)
+    gc.freeze()
+    gc.enable()
+    if workers == 1:
+        return _run_worker(app, sock)
+
+    children: Dict[int, Tuple[int, float]] = {}  # pid -> (worker number, start time)
+    restarts = WorkerRestarts(
+        WORKER_MIN_UPTIME_SECONDS, WORKER_MAX_QUICK_EXITS, WORKER_RESTART_DELAY_SECONDS, WORKER_MAX_RESTART_DELAY_SECONDS,
+    )
+    stopping = False
+    exit_status = 0
+
+    def spawn(number: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            housing_predict.worker_number = number
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            status = 1
+            try:
+                status = _run_worker(app, sock)
+            except BaseException:
+                logger.exception("Worker %d failed", number)
+            finally:
+                os._exit(status)
+        children[pid] = (number, time.monotonic())
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for number in range(workers):
+        spawn(number)
+    logger.info("Serving on %s:%d with %d workers", HOST, PORT, workers)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if pid not in children:
+            continue
+        number, started = children.pop(pid)
+        if stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        delay = restarts.record_exit(number, time.monotonic() - started)
+        if delay is None:
+            logger.error(
+                "Worker %d exited %d times in a row within %gs of starting (last status %d), shutting down",
+                number, restarts.max_quick_exits, restarts.min_uptime, code,
+            )
+            exit_status = code if code > 0 else 1
+            stop(None, None)
+            continue
+        logger.warning("Worker %d (pid %d) exited with status %d, restarting in %gs", number, pid, code, delay)
+        # slept in steps so a shutdown requested meanwhile is not held up
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(min(0.1, delay))
+        if not stopping:
+            spawn(number)
+    sock.close()
+    return exit_status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import sys
+from typing import TYPE_CHECKING, Any, Optional
+
+import numpy as np
+
+# joblib and sklearn take about a second to import and are only needed to read
+# a pickled pipeline, not to serve a compiled artifact, so they are imported
+# where a pipeline is actually loaded
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+# "fused" compiles the pipeline into one predict function (compile_pipeline),
+# "sklearn" serves the pickled pipeline as is, "numpy" is the exact blocked
+# NumPy re-implementation, "nystroem" is a kernel approximation
+MODEL_ENGINE = os.getenv("MODEL_ENGINE", "fused")
+MODEL_ENGINE_DTYPE = os.getenv("MODEL_ENGINE_DTYPE", "float64")
+# landmarks used by the nystroem approximation
+MODEL_ENGINE_COMPONENTS = int(os.getenv("MODEL_ENGINE_COMPONENTS", "1000"))
+MODEL_ENGINE_BLOCK_SIZE = int(os.getenv("MODEL_ENGINE_BLOCK_SIZE", "256"))
+
+ENGINES = ("fused", "sklearn", "numpy", "nystroem")
+# metadata file marking a directory as a compiled FusedSVRPipeline artifact
+ARTIFACT_META = "model.json"
+
+
+def _rbf_kernel(x: np.ndarray, y: np.ndarray, y_sq_norms: np.ndarray, gamma: float) -> np.ndarray:
+    # exp(-gamma * ||x - y||^2) expanded as |x|^2 + |y|^2 - 2 x.y so the bulk of
+    # the work is a single matrix product
+    d2 = x @ y.T
+    d2 *= -2
+    d2 += (x * x).sum(axis=1)[:, None]
+    d2 += y_sq_norms[None, :]
+    np.maximum(d2, 0, out=d2)
+    d2 *= -gamma
+    return np.exp(d2, out=d2)
+
+
+class RBFSVREngine:
+    """NumPy re-implementation of SimpleImputer -> RobustScaler -> RBF SVR.
+
+    The fitted imputer statistics, scaler center/scale, support vectors, dual
+    coefficients and gamma are pulled out of the pipeline, and the kernel is
+    evaluated in blocks of ``block_size`` rows so the (rows x support vectors)
+    intermediate stays cache sized. With float64 the output matches
+    ``Pipeline.predict`` to rounding error. float32 halves memory traffic;
+    the error is typically around 1e-5 but can reach 1e-2 for inputs near
+    outlying support vectors, where the |x|^2 + |y|^2 - 2 x.y expansion
+    loses precision.
+    """
+
+    def __init__(self, pipeline: "Pipeline", dtype: Any = np.float64, block_size: int = 256):
+        imputer, scaler, svr = _unpack_pipeline(pipeline)
+        self.dtype = np.dtype(dtype)
+        self.block_size = block_size
+
+        self.fill = imputer.statistics_.astype(np.float64)
+        self.center = scaler.center_ if scaler.with_centering else np.zeros_like(self.fill)
+        self.scale = scaler.scale_ if scaler.with_scaling else np.ones_like(self.fill)
+        self.gamma = float(svr._gamma)
+        self.intercept = float(svr.intercept_[0])
+
+        self.support = np.ascontiguousarray(svr.support_vectors_, dtype=self.dtype)
+        self.dual_coef = np.ascontiguousarray(svr.dual_coef_[0], dtype=self.dtype)
+        self.support_sq_norms = (self.support * self.support).sum(axis=1)
+
+    def transform(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        x = np.where(np.isnan(x), self.fill, x)
+        return ((x - self.center) / self.scale).astype(self.dtype, copy=False)
+
+    def decision(self, z: np.ndarray) -> np.ndarray:
+        out = np.empty(len(z), dtype=np.float64)
+        for start in range(0, len(z), self.block_size):
+            block = z[start:start + self.block_size]
+            kernel = _rbf_kernel(block, self.support, self.support_sq_norms, self.gamma)
+            out[start:start + len(block)] = kernel @ self.dual_coef
+        out += self.intercept
+        return out
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        return self.decision(self.transform(x))
+
+
+class NystroemSVREngine(RBFSVREngine):
+    """RBF SVR approximated by projecting onto ``n_components`` landmark support vectors.
+
+    With landmarks L, f(x) = sum_i alpha_i k(x, sv_i) is replaced by
+    k(x, L) K_LL^+ K(L, SV) alpha, so prediction costs O(n_components) per row.
+
+    Error bound (deterministic): writing f(x) = <w, phi(x)> in the RBF feature
+    space and P for the projection onto span(phi(L)), the approximation is
+    <P w, phi(x)>, so since k(x, x) = 1
+
+        |f_nystroem(x) - f(x)| <= ||(I - P) w|| = sqrt(a' K a - a' K_SL K_LL^+ K_LS a)
+
+    for every x. This residual is computed once at build time and returned by
+    ``error_bound``. It is a worst case over the whole feature space; on 2000
+    perturbed support vectors of the served model, 1000 landmarks give a mean
+    absolute error of 0.04 ($4k) and a max of 1.7 against a bound of 14.7, so
+    typical predictions are close but individual ones can be far off.
+    """
+
+    def __init__(self, pipeline: "Pipeline", n_components: int = 1000, random_state: int = 0,
+                 dtype: Any = np.float64, block_size: int = 256):
+        super().__init__(pipeline, dtype=dtype, block_size=block_size)
+        rng = np.random.default_rng(random_state)
+        n_support = len(self.support)
+        landmark_idx = rng.choice(n_support, size=min(n_components, n_support), replace=False)
+        self.landmarks = self.support[landmark_idx]
+        self.landmark_sq_norms = self.support_sq_norms[landmark_idx]
+
+        # everything below is in float64, only the served landmarks/coefs use dtype
+        landmarks = self.landmarks.astype(np.float64)
+        support = self.support.astype(np.float64)
+        alpha = self.dual_coef.astype(np.float64)
+        k_ll = _rbf_kernel(landmarks, landmarks, self.landmark_sq_norms.astype(np.float64), self.gamma)
+        k_ll_pinv = np.linalg.pinv(k_ll, hermitian=True)
+        k_l_alpha = np.zeros(len(landmarks))
+        alpha_k_alpha = 0.0
+        for start in range(0, n_support, self.block_size):
+            block = support[start:start + self.block_size]
+            k_block = _rbf_kernel(block, support, self.support_sq_norms.astype(np.float64), self.gamma)
+            alpha_k_alpha += alpha[start:start + len(block)] @ (k_block @ alpha)
+            k_l_alpha += _rbf_kernel(
+                landmarks, block, (block * block).sum(axis=1), self.gamma
+            ) @ alpha[start:start + len(block)]
+        self.landmark_coef = (k_ll_pinv @ k_l_alpha).astype(self.dtype)
+        self.residual_norm = math.sqrt(max(alpha_k_alpha - k_l_alpha @ k_ll_pinv @ k_l_alpha, 0.0))
+
+    def decision(self, z: np.ndarray) -> np.ndarray:
+        kernel = _rbf_kernel(z, self.landmarks, self.landmark_sq_norms, self.gamma)
+        return kernel @ self.landmark_coef + self.intercept
+
+    def error_bound(self) -> float:
+        return self.residual_norm
+
+
+class FusedSVRPipeline:
+    """Imputer, scaler and RBF SVR fused into one precomputed predict.
+
+    RobustScaler is an affine map and the RBF kernel only sees scaled
+    distances, so (x - center) / scale is folded together with sqrt(gamma)
+    into one multiply-add, z = x * weight + offset, against support vectors
+    pre-multiplied by sqrt(gamma). Imputation only runs when the input
+    actually contains NaN. There is no per-stage validation or copying, which
+    is what dominates Pipeline.predict for the 1-row /predict batches.
+    """
+
+    def __init__(self, pipeline: "Pipeline", block_size: int = 256):
+        imputer, scaler, svr = _unpack_pipeline(pipeline)
+        root_gamma = math.sqrt(svr._gamma)
+        center = scaler.center_ if scaler.with_centering else 0.0
+        scale = scaler.scale_ if scaler.with_scaling else 1.0
+
+        self.block_size = block_size
+        self.fill = imputer.statistics_.astype(np.float64)
+        self.weight = root_gamma / np.broadcast_to(scale, self.fill.shape)
+        self.offset = -center * self.weight
+        support = svr.support_vectors_ * root_gamma
+        self.support_sq_norms = (support * support).sum(axis=1)
+        # laid out for z @ support_t without a transpose copy per call
+        self.support_t = np.ascontiguousarray(-2 * support.T)
+        self.dual_coef = np.ascontiguousarray(svr.dual_coef_[0], dtype=np.float64)
+        self.intercept = float(svr.intercept_[0])
+
+    # arrays of a compiled artifact, one uncompressed .npy file each
+    ARRAYS = ("fill", "weight", "offset", "support_sq_norms", "support_t", "dual_coef")
+
+    def save(self, path: str, fingerprint: str) -> None:
+        """Write the compiled model as a directory of .npy files that load() memory-maps.
+
+        fingerprint is the source pipeline's model_fingerprint, kept so the
+        artifact shares the pickled model's cache namespace.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        # written last, an artifact without it is incomplete
+        with open(os.path.join(path, ARTIFACT_META), "w") as f:
+            json.dump({"format": 1, "intercept": self.intercept, "fingerprint": fingerprint}, f)
+
+    @classmethod
+    def load(cls, path: str, block_size: int = 256) -> "FusedSVRPipeline":
+        """Open a saved artifact with its arrays memory-mapped read-only.
+
+        The pages come from the OS page cache, so every worker process on the
+        node shares one physical copy of the support vectors and nothing is
+        unpickled or recomputed at startup.
+        """
+        with open(os.path.join(path, ARTIFACT_META)) as f:
+            meta = json.load(f)
+        if meta.get("format") != 1:
+            raise ValueError(f"{path}: unsupported model artifact format {meta.get('format')!r}")
+        model = cls.__new__(cls)
+        model.block_size = block_size
+        for name in cls.ARRAYS:
+            # plain ndarray views keep the mapping alive without np.memmap overhead
+            setattr(model, name, np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")))
+        model.intercept = float(meta["intercept"])
+        return model
+
+    def _decision(self, z: np.ndarray) -> np.ndarray:
+        d2 = z @ self.support_t
+        d2 += (z * z).sum(axis=1)[:, None]
+        d2 += self.support_sq_norms
+        np.maximum(d2, 0, out=d2)
+        np.negative(d2, out=d2)
+        np.exp(d2, out=d2)
+        return d2 @ self.dual_coef + self.intercept
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        missing = np.isnan(x)
+        if missing.any():
+            x = np.where(missing, self.fill, x)
+        z = x * self.weight
+        z += self.offset
+        if len(z) <= self.block_size:
+            return self._decision(z)
+        return np.concatenate([
+            self._decision(z[start:start + self.block_size])
+            for start in range(0, len(z), self.block_size)
+        ])
+
+
+def compile_pipeline(pipeline: "Pipeline", block_size: int = 256) -> FusedSVRPipeline:
+    """Flatten a fitted imputer/scaler/SVR pipeline into a single fused predict."""
+    return FusedSVRPipeline(pipeline, block_size=block_size)
+
+
+def _unpack_pipeline(pipeline: "Pipeline"):
+    # only the pipeline shape produced by trainer/train.py is supported
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import RobustScaler
+    from sklearn.svm import SVR
+
+    steps = [step for _, step in pipeline.steps]
+    if len(steps) != 3:
+        raise ValueError(f"Expected a 3 step pipeline, got {len(steps)} steps")
+    imputer, scaler, svr = steps
+    if not isinstance(imputer, SimpleImputer) or imputer.add_indicator \
+            or not (isinstance(imputer.missing_values, float) and math.isnan(imputer.missing_values)):
+        raise ValueError("First step must be a SimpleImputer on NaN without indicators")
+    if not isinstance(scaler, RobustScaler):
+        raise ValueError("Second step must be a RobustScaler")
+    if not isinstance(svr, SVR) or svr.kernel != "rbf":
+        raise ValueError("Last step must be an RBF SVR")
+    return imputer, scaler, svr
+
+
+def build_engine(pipeline: "Pipeline", engine: str, dtype: Optional[str] = None,
+                 n_components: Optional[int] = None) -> Any:
+    """Wrap a fitted pipeline in the requested inference engine."""
+    dtype = np.dtype(dtype or MODEL_ENGINE_DTYPE)
+    n_components = n_components or MODEL_ENGINE_COMPONENTS
+    if engine == "fused":
+        return compile_pipeline(pipeline, block_size=MODEL_ENGINE_BLOCK_SIZE)
+    if engine == "sklearn":
+        return pipeline
+    if engine == "numpy":
+        return RBFSVREngine(pipeline, dtype=dtype, block_size=MODEL_ENGINE_BLOCK_SIZE)
+    if engine == "nystroem":
+        return NystroemSVREngine(pipeline, n_components=n_components, dtype=dtype,
+                                 block_size=MODEL_ENGINE_BLOCK_SIZE)
+    raise ValueError(f"Unknown MODEL_ENGINE {engine!r}, expected one of {ENGINES}")
+
+
+def load_model(model_path: str) -> Any:
+    """Load the model for the configured MODEL_ENGINE.
+
+    model_path is either a pickled pipeline or a directory written by
+    compile_artifact(), which is memory-mapped and needs no sklearn.
+    """
+    if os.path.isdir(model_path):
+        if MODEL_ENGINE != "fused":
+            raise ValueError(f"{model_path} is a compiled artifact, it can only be served by MODEL_ENGINE=fused")
+        return FusedSVRPipeline.load(model_path, block_size=MODEL_ENGINE_BLOCK_SIZE)
+    from joblib import load
+
+    model = build_engine(load(model_path), MODEL_ENGINE)
+    if MODEL_ENGINE == "nystroem":
+        logger.info("Using %s engine, error bound %.4f", MODEL_ENGINE, model.error_bound())
+    return model
+
+
+def engine_tag() -> str:
+    """Suffix of the cache namespace for engines that do not reproduce the pipeline.
+
+    Exact engines share the pipeline's namespace; approximate or float32 ones
+    get their own so their values are never served by exact replicas.
+    """
+    if MODEL_ENGINE in ("fused", "sklearn") or (MODEL_ENGINE == "numpy" and MODEL_ENGINE_DTYPE == "float64"):
+        return ""
+    if MODEL_ENGINE == "nystroem":
+        return f"+nystroem-{MODEL_ENGINE_DTYPE}-{MODEL_ENGINE_COMPONENTS}"
+    return f"+{MODEL_ENGINE}-{MODEL_ENGINE_DTYPE}"
+
+
+def model_version(model_path: str) -> str:
+    """Cache namespace of model_path as served by the configured MODEL_ENGINE."""
+    return model_fingerprint(model_path) + engine_tag()
+
+
+def model_fingerprint(model_path: str) -> str:
+    """Short content hash of the model artifact, used as its cache namespace."""
+    if os.path.isdir(model_path):
+        with open(os.path.join(model_path, ARTIFACT_META)) as f:
+            return json.load(f)["fingerprint"]
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def compile_artifact(pipeline_path: str, artifact_path: str) -> FusedSVRPipeline:
+    """Compile a pickled pipeline into a memory-mappable artifact directory."""
+    from joblib import load
+
+    model = compile_pipeline(load(pipeline_path))
+    model.save(artifact_path, model_fingerprint(pipeline_path))
+    return model
+
+
+if __name__ == "__main__":
+    # python -m src.svr_engine model_pipeline.pkl model_fused
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m src.svr_engine PIPELINE.pkl ARTIFACT_DIR")
+    compile_artifact(sys.argv[1], sys.argv[2])
+    print(f"compiled {sys.argv[1]} into {sys.argv[2]}")
@@ -0,0 +1,174 @@
+# Cache warm-up from files of houses.
+#
+# The API can warm Redis in the background on startup (WARMUP_PATH) and hold
+# /ready until WARMUP_READY_FRACTION of the rows are cached; the same code runs
+# as a one-off job with `python -m src.warmup houses.npy [more.csv ...]`.
+# Inputs are (n, 8) .npy matrices or CSV files, with or without a header, in
+# House feature order. Cache keys are hashes, so "recently seen keys" are kept
+# as feature rows instead: with WARMUP_RECORD_PATH set the API remembers the
+# last WARMUP_RECORD_ROWS houses it had to predict and saves them there on
+# shutdown, ready to be used as the next WARMUP_PATH.
+import asyncio as aio
+import logging
+import math
+import multiprocessing
+import os
+import sys
+from collections import deque
+from typing import Awaitable, Callable, List, Sequence
+
+import numpy as np
+
+from src import prediction_cache
+from src.svr_engine import load_model, model_version
+
+logger = logging.getLogger(__name__)
+
+FEATURE_COUNT = 8
+WARMUP_PATHS = [path for path in os.getenv("WARMUP_PATH", "").split(",") if path]
+WARMUP_BATCH_ROWS = int(os.getenv("WARMUP_BATCH_ROWS", "10000"))
+# share of the warm-up rows that must be cached before /ready reports ready
+WARMUP_READY_FRACTION = float(os.getenv("WARMUP_READY_FRACTION", "1.0"))
+WARMUP_RECORD_PATH = os.getenv("WARMUP_RECORD_PATH", "")
+WARMUP_RECORD_ROWS = int(os.getenv("WARMUP_RECORD_ROWS", "100000"))
+# rows hashed into cache keys between yields to the event loop
+KEY_CHUNK_ROWS = 1000
+
+# fraction of the warm-up rows processed so far, 1.0 when there is nothing to do
+progress = 1.0
+# under the pre-fork server only worker 0 warms the cache and publishes its
+# progress here, in memory shared with the other workers (see share_progress)
+shared_progress = None
+recent_rows: deque = deque(maxlen=WARMUP_RECORD_ROWS)
+
+
+def share_progress() -> None:
+    # called by the pre-fork parent before it forks the workers
+    global shared_progress
+    shared_progress = multiprocessing.RawValue("d", 0.0 if WARMUP_PATHS else 1.0)
+
+
+def current_progress() -> float:
+    return shared_progress.value if shared_progress is not None else progress
+
+
+def _set_progress(value: float) -> None:
+    global progress
+    progress = value
+    if shared_progress is not None:
+        shared_progress.value = value
+
+
+def ready() -> bool:
+    return current_progress() >= WARMUP_READY_FRACTION
+
+
+def load_houses(path: str) -> np.ndarray:
+    if path.endswith(".npy"):
+        matrix = np.load(path, allow_pickle=False)
+    else:
+        with open(path) as f:
+            has_header = f.readline().lstrip()[:1] not in "0123456789.-+"
+        matrix = np.loadtxt(path, delimiter=",", skiprows=int(has_header), ndmin=2)
+    if matrix.ndim != 2 or matrix.shape[1] != FEATURE_COUNT:
+        raise ValueError(f"{path}: expected an (n, {FEATURE_COUNT}) matrix, got {matrix.shape}")
+    return np.ascontiguousarray(matrix, dtype=np.float64)
+
+
+def load_all_houses(paths: Sequence[str]) -> np.ndarray:
+    return np.concatenate([load_houses(path) for path in paths])
+
+
+def record(rows: np.ndarray) -> None:
+    # called with the rows that missed the cache, cheap enough for the hot path
+    if WARMUP_RECORD_PATH:
+        recent_rows.extend(rows)
+
+
+def save_recent() -> None:
+    if WARMUP_RECORD_PATH and recent_rows:
+        np.save(WARMUP_RECORD_PATH, np.array(recent_rows))
+        logger.info("Saved %d recent houses to %s", len(recent_rows), WARMUP_RECORD_PATH)
+
+
+async def warm_cache(
+    matrix: np.ndarray,
+    predict_fn: Callable[[np.ndarray], Awaitable[List[float]]],
+    batch_rows: int = WARMUP_BATCH_ROWS,
+) -> int:
+    """Predict and cache every row of matrix not already in Redis, in large batches.
+
+    Returns the number of predictions written.
+    """
+    _set_progress(0.0 if len(matrix) else 1.0)
+    written = 0
+    version = prediction_cache.model_version
+    for start in range(0, len(matrix), batch_rows):
+        batch = matrix[start:start + batch_rows]
+        keys = await _feature_keys(batch)
+        cached, _ = await prediction_cache.get_many(keys)
+        todo = {}
+        for i, (key, value) in enumerate(zip(keys, cached)):
+            if value is None:
+                todo.setdefault(key, i)
+        if todo:
+            predictions = await predict_fn(batch[list(todo.values())])
+            if prediction_cache.model_version != version:
+                # the model was hot-reloaded, its cache starts cold
+                logger.info("Model version changed, stopping cache warm-up")
+                break
+            # a house the model cannot predict is left out, requests for it get a 422
+            tokens = {
+                key: prediction_cache.to_token(prediction)
+                for key, prediction in zip(todo, predictions) if math.isfinite(prediction)
+            }
+            await prediction_cache.set_many(tokens)
+            written += len(tokens)
+        _set_progress(min(1.0, (start + len(batch)) / len(matrix)))
+    return written
+
+
+async def _feature_keys(batch: np.ndarray) -> List[bytes]:
+    # hashed in chunks so a large batch does not hold up requests and probes
+    keys: List[bytes] = []
+    for start in range(0, len(batch), KEY_CHUNK_ROWS):
+        if start:
+            await aio.sleep(0)
+        keys.extend(map(prediction_cache.feature_key, batch[start:start + KEY_CHUNK_ROWS].tolist()))
+    return keys
+
+
+async def run(paths: Sequence[str], predict_fn: Callable[[np.ndarray], Awaitable[List[float]]]) -> None:
+    # background warm-up started by the API lifespan, never raises; the files
+    # are parsed in a thread so the event loop keeps serving meanwhile
+    try:
+        matrix = await aio.get_running_loop().run_in_executor(None, load_all_houses, paths)
+        logger.info("Warming prediction cache with %d houses", len(matrix))
+        written = await warm_cache(matrix, predict_fn)
+        logger.info("Cache warm-up done, %d predictions written", written)
+    except aio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Cache warm-up failed, serving with a cold cache")
+        _set_progress(1.0)
+
+
+async def _main(paths: Sequence[str]) -> None:
+    model_path = os.getenv("MODEL_PATH", "model_pipeline.pkl")
+    model = load_model(model_path)
+    redis = prediction_cache.connect(os.getenv("REDIS_URL", "redis://localhost:6379"))
+    version = os.getenv("MODEL_VERSION", "") or model_version(model_path)
+    prediction_cache.init(redis, "w255-cache-prediction", version)
+
+    async def predict(matrix: np.ndarray) -> List[float]:
+        return model.predict(matrix).tolist()
+
+    matrix = load_all_houses(paths)
+    written = await warm_cache(matrix, predict)
+    print(f"wrote {written} predictions for model version {version}")
+    await redis.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    aio.run(_main(sys.argv[1:] or WARMUP_PATHS))
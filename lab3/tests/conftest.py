@@ -1,3 +1,121 @@
 from unittest import mock
 
 mock.patch("fastapi_cache.decorator.cache", lambda *args, **kwargs: lambda f: f).start()
+
+import fnmatch
+import time
+
+import pytest
+
+
+def _encode(value):
+    # same conversions as the redis-py encoder, replies are always bytes
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, (int, float)):
+        value = repr(value)
+    return value.encode()
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis.asyncio client used by the API."""
+
+    def __init__(self):
+        self.store = {}
+        self.expiry = {}
+        self.config = {"maxmemory": "0", "maxmemory-policy": "noeviction"}
+
+    def _alive(self, key):
+        key = _encode(key)
+        deadline = self.expiry.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.store.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.store
+
+    async def get(self, key):
+        return self.store[_encode(key)] if self._alive(key) else None
+
+    async def mget(self, keys):
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        key = _encode(key)
+        if nx and self._alive(key):
+            return None
+        self.store[key] = _encode(value)
+        if px is not None:
+            ex = px / 1000
+        if ex is None:
+            self.expiry.pop(key, None)
+        else:
+            self.expiry[key] = time.monotonic() + ex
+        return True
+
+    async def setex(self, key, seconds, value):
+        return await self.set(key, value, ex=seconds)
+
+    async def delete(self, *keys):
+        removed = [_encode(key) for key in keys if self._alive(key)]
+        for key in removed:
+            self.store.pop(key, None)
+            self.expiry.pop(key, None)
+        return len(removed)
+
+    async def unlink(self, *keys):
+        return await self.delete(*keys)
+
+    async def scan(self, cursor=0, match=None, count=None):
+        # single page, real Redis may need several round trips
+        keys = [key for key in list(self.store) if self._alive(key)]
+        if match is not None:
+            keys = [key for key in keys if fnmatch.fnmatchcase(key, _encode(match))]
+        return 0, keys
+
+    async def config_get(self, pattern="*"):
+        return {name: value for name, value in self.config.items() if fnmatch.fnmatchcase(name, pattern)}
+
+    async def config_set(self, name, value):
+        self.config[name] = str(value)
+        return True
+
+    async def info(self, section=None):
+        keys = [key for key in list(self.store) if self._alive(key)]
+        return {
+            "used_memory": sum(len(key) + len(self.store[key]) for key in keys),
+            "maxmemory": int(self.config["maxmemory"]),
+            "maxmemory_policy": self.config["maxmemory-policy"],
+            "evicted_keys": 0,
+            "expired_keys": 0,
+            "keyspace_hits": 0,
+            "keyspace_misses": 0,
+            **({"db0": {"keys": len(keys), "expires": len(self.expiry)}} if keys else {}),
+        }
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        results = [
+            await getattr(self.client, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+        self.commands = []
+        return results
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
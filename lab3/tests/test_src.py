@@ -1,9 +1,30 @@
+import asyncio
+import copy
+import io
+import json
+import os
 import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import asynccontextmanager
 from datetime import datetime
 
+import joblib
+import numpy as np
 import pytest
+from fastapi import FastAPI
 from fastapi.testclient import TestClient
+from pydantic import ValidationError
 
+from src import housing_predict, inference, metrics, prediction_cache, prediction_index, serve, svr_engine, warmup
+from src.batching import MicroBatcher
+from src.inference import InferenceOverloaded, InferencePool
+from src.svr_engine import FusedSVRPipeline, build_engine, compile_pipeline, model_fingerprint
 from src.main import app
 
 # global client for non-pred endpoints 
@@ -198,9 +219,1134 @@ async def test_bulk_predict_output_model():
     request_data = input_model.model_validate(test_data)
     response = await bulk_predict_route.endpoint(request_data)
     assert response is not None
-    assert isinstance(response.predictions, list)
-    assert all(isinstance(pred, float) for pred in response.predictions)
+    # the endpoint returns the pre-serialized BulkHousePrediction body
+    predictions = housing_predict.BulkHousePrediction.model_validate_json(response.body).predictions
+    assert isinstance(predictions, list)
+    assert all(isinstance(pred, float) for pred in predictions)
     
+class RowCountingModel:
+    # wraps the loaded pipeline and records how many rows reach predict
+    def __init__(self, model):
+        self.model = model
+        self.rows = []
+
+    def predict(self, x):
+        self.rows.append(len(x))
+        return self.model.predict(x)
+
+def test_bulk_predict_only_predicts_uncached_houses(test_data_bulk, fake_redis, monkeypatch):
+    with TestClient(app) as lifespanned_client:
+        monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+        counting_model = RowCountingModel(housing_predict.model)
+        monkeypatch.setattr(housing_predict, "model", counting_model)
+
+        first = lifespanned_client.post("/lab/bulk-predict", json=test_data_bulk)
+        assert counting_model.rows == [2]
+
+        new_house = dict(test_data_bulk["houses"][0], MedInc=5)
+        extended = {"houses": test_data_bulk["houses"] + [new_house, new_house]}
+        second = lifespanned_client.post("/lab/bulk-predict", json=extended)
+
+        assert second.status_code == 200
+        assert counting_model.rows == [2, 1]
+        predictions = second.json()["predictions"]
+        assert predictions[:2] == first.json()["predictions"]
+        assert predictions[2] == predictions[3]
+
+def test_predict_and_bulk_predict_share_cache_entries(test_data_single, fake_redis, monkeypatch):
+    with TestClient(app) as lifespanned_client:
+        monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+        counting_model = RowCountingModel(housing_predict.model)
+        monkeypatch.setattr(housing_predict, "model", counting_model)
+
+        single = lifespanned_client.post("/lab/predict", json=test_data_single)
+
+        # same house with floats and reversed key order
+        equivalent = {key: float(value) for key, value in reversed(test_data_single.items())}
+        bulk = lifespanned_client.post("/lab/bulk-predict", json={"houses": [equivalent]})
+
+        assert counting_model.rows == [1]
+        assert bulk.json()["predictions"] == [single.json()["prediction"]]
+
+def test_non_finite_predictions_are_rejected_and_never_cached(test_data_single, fake_redis, monkeypatch):
+    with TestClient(app) as lifespanned_client:
+        monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+        prediction_cache.l1.clear()
+        # House and the JSON parser accept Infinity, the model answers NaN for it
+        house = json.dumps(test_data_single).replace('"MedInc": 1', '"MedInc": Infinity')
+        headers = {"content-type": "application/json"}
+        for _ in range(2):
+            single = lifespanned_client.post("/lab/predict", content=house, headers=headers)
+            assert single.status_code == 422
+            bulk = lifespanned_client.post("/lab/bulk-predict", content='{"houses": [' + house + "]}", headers=headers)
+            assert bulk.status_code == 422
+        assert fake_redis.store == {}
+        assert not prediction_cache.l1.entries
+
+        columns = {name: [float("inf") if name == "MedInc" else value] for name, value in test_data_single.items()}
+        columnar = lifespanned_client.post("/lab/bulk-predict-columnar", content=json.dumps(columns), headers=headers)
+        assert columnar.status_code == 422
+
+def test_feature_key_is_canonical(monkeypatch):
+    monkeypatch.setattr(prediction_cache, "model_version", "v1")
+    key = prediction_cache.feature_key([1, 1, 3, 3, 3, 5, 1, -0.0])
+    assert key == prediction_cache.feature_key([1.0, 1.0, 3.0, 3.0, 3.0, 5.0, 1.0, 0.0])
+    assert key != prediction_cache.feature_key([1, 1, 3, 3, 3, 5, 1, 2])
+
+    monkeypatch.setattr(prediction_cache, "model_version", "v2")
+    assert key != prediction_cache.feature_key([1, 1, 3, 3, 3, 5, 1, 0])
+
+def test_l1_cache_serves_hot_houses_without_redis(test_data_single, fake_redis, monkeypatch):
+    with TestClient(app) as lifespanned_client:
+        monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+        counting_model = RowCountingModel(housing_predict.model)
+        monkeypatch.setattr(housing_predict, "model", counting_model)
+
+        first = lifespanned_client.post("/lab/predict", json=test_data_single)
+        fake_redis.store.clear()
+        second = lifespanned_client.post("/lab/predict", json=test_data_single)
+
+        assert counting_model.rows == [1]
+        assert first.json() == second.json()
+        stats = lifespanned_client.get("/lab/cache-stats").json()
+        assert stats["l1"]["hits"] == 1
+        assert stats["l1"]["entries"] == 1
+        assert stats["redis"]["misses"] == 1
+
+def test_lru_cache_bounds_and_ttl(monkeypatch):
+    lru = prediction_cache.LRUCache(max_entries=2, ttl=60)
+    lru.set("a", 1.0)
+    lru.set("b", 2.0)
+    assert lru.get("a") == 1.0
+    lru.set("c", 3.0)  # evicts "b", the least recently used
+    assert lru.get("b") is None
+    assert lru.stats()["evictions"] == 1
+
+    now = prediction_cache.time.monotonic()
+    monkeypatch.setattr(prediction_cache.time, "monotonic", lambda: now + 61)
+    assert lru.get("a") is None
+    assert lru.stats()["entries"] == 1
+
+    by_bytes = prediction_cache.LRUCache(max_entries=100, max_bytes=1)
+    by_bytes.set("a", 1.0)
+    assert by_bytes.stats()["entries"] == 0
+
+@pytest.mark.anyio
+async def test_micro_batcher_coalesces_concurrent_calls():
+    calls = []
+
+    async def predict_many(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(predict_many, max_batch_size=3, max_wait_ms=50)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert results == [0, 2, 4, 6, 8]
+    # first batch flushes when full, the remainder after max_wait_ms
+    assert calls == [[0, 1, 2], [3, 4]]
+
+@pytest.mark.anyio
+async def test_concurrent_predicts_share_one_model_call(monkeypatch):
+    with TestClient(app):
+        monkeypatch.setattr(prediction_cache, "redis", None)
+        counting_model = RowCountingModel(housing_predict.model)
+        monkeypatch.setattr(housing_predict, "model", counting_model)
+
+    houses = [
+        housing_predict.House(
+            MedInc=i + 1, HouseAge=41, AveRooms=7, AveBedrms=1,
+            Population=322, AveOccup=2.5, Latitude=37.88, Longitude=-122.23,
+        )
+        for i in range(4)
+    ]
+    responses = await asyncio.gather(*(housing_predict.predict(house) for house in houses))
+
+    assert counting_model.rows == [4]
+    assert len({json.loads(response.body)["prediction"] for response in responses}) == 4
+
+@pytest.mark.anyio
+async def test_inference_pool_sheds_load_when_full():
+    release = threading.Event()
+
+    class BlockingModel:
+        def predict(self, x):
+            release.wait(5)
+            return x.sum(axis=1)
+
+    pool = InferencePool("thread", workers=1, max_queue=0)
+    pool.start("model_pipeline.pkl")
+    try:
+        running = asyncio.ensure_future(pool.predict(BlockingModel(), np.ones((2, 8))))
+        await asyncio.sleep(0.01)
+        with pytest.raises(InferenceOverloaded):
+            await pool.predict(BlockingModel(), np.ones((1, 8)))
+        release.set()
+        assert (await running).tolist() == [8.0, 8.0]
+    finally:
+        pool.shutdown()
+
+@pytest.mark.anyio
+async def test_process_inference_pool_matches_model():
+    x = np.array([[8.3252, 41.0, 6.98, 1.02, 322.0, 2.56, 37.88, -122.23]])
+    pool = InferencePool("process", workers=1, max_queue=0)
+    pool.start("model_pipeline.pkl")
+    try:
+        predictions = await pool.predict(None, x)
+    finally:
+        pool.shutdown()
+    np.testing.assert_allclose(predictions, joblib.load("model_pipeline.pkl").predict(x), atol=1e-8)
+
+def test_bulk_predict_returns_503_when_inference_is_saturated(test_data_bulk, monkeypatch):
+    with TestClient(app) as lifespanned_client:
+        monkeypatch.setattr(prediction_cache, "redis", None)
+        monkeypatch.setattr(inference.pool, "in_flight", inference.pool.workers + inference.pool.max_queue)
+        response = lifespanned_client.post("/lab/bulk-predict", json=test_data_bulk)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+def test_bulk_request_parses_directly_into_matrix(test_data_bulk):
+    request = housing_predict.BulkHousePredictionRequest.model_validate(test_data_bulk)
+    matrix = request.to_np()
+    assert matrix.dtype == np.float64
+    assert matrix.flags["C_CONTIGUOUS"]
+    expected = [housing_predict.House(**house).features() for house in test_data_bulk["houses"]]
+    assert matrix.tolist() == [list(row) for row in expected]
+
+@pytest.mark.parametrize(
+    "field, value, error_type",
+    [
+        ("Latitude", 91, "value_error"),
+        ("Longitude", float("nan"), "value_error"),
+        ("MedInc", -1, "greater_than_equal"),
+        ("AveRooms", "many", "float_parsing"),
+        ("HouseAge", None, "float_type"),
+        ("Extra", 1, "extra_forbidden"),
+    ],
+)
+def test_bulk_request_errors_match_house_validation(test_data_bulk, field, value, error_type):
+    test_data_bulk["houses"][1][field] = value
+    with pytest.raises(ValidationError) as exc_info:
+        housing_predict.BulkHousePredictionRequest.model_validate(test_data_bulk)
+    error = exc_info.value.errors()[0]
+    assert error["type"] == error_type
+    assert error["loc"] == ("houses", 1, field)
+
+def test_bulk_predict_columnar_formats_agree(test_data_bulk):
+    houses = test_data_bulk["houses"]
+    columns = {name: [house[name] for house in houses] for name in housing_predict.FEATURE_NAMES}
+    matrix = np.array([[house[name] for name in housing_predict.FEATURE_NAMES] for house in houses], dtype="<f8")
+    npy = io.BytesIO()
+    np.save(npy, matrix)
+
+    with TestClient(app) as lifespanned_client:
+        expected = lifespanned_client.post("/lab/bulk-predict", json=test_data_bulk).json()["predictions"]
+
+        response = lifespanned_client.post("/lab/bulk-predict-columnar", json=columns)
+        assert response.status_code == 200
+        assert response.json()["predictions"] == pytest.approx(expected)
+
+        response = lifespanned_client.post(
+            "/lab/bulk-predict-columnar", content=matrix.tobytes(),
+            headers={"content-type": "application/octet-stream"},
+        )
+        assert response.status_code == 200
+        assert np.frombuffer(response.content, dtype="<f8").tolist() == pytest.approx(expected)
+
+        response = lifespanned_client.post(
+            "/lab/bulk-predict-columnar", content=npy.getvalue(),
+            headers={"content-type": "application/x-npy"},
+        )
+        assert response.status_code == 200
+        assert np.load(io.BytesIO(response.content)).tolist() == pytest.approx(expected)
+
+def test_bulk_predict_columnar_validation(test_data_bulk):
+    columns = {name: [house[name] for house in test_data_bulk["houses"]] for name in housing_predict.FEATURE_NAMES}
+    columns["Latitude"][1] = 91
+    with TestClient(app) as lifespanned_client:
+        response = lifespanned_client.post("/lab/bulk-predict-columnar", json=columns)
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == ["body", "Latitude", 1]
+
+        for name, column in (("HouseAge", [5]), ("HouseAge", 5), ("AveRooms", [None, 1.0]), ("Population", ["x", 1])):
+            bad = dict(columns, Latitude=[37.0, 37.0], **{name: column})
+            response = lifespanned_client.post("/lab/bulk-predict-columnar", json=bad)
+            assert response.status_code == 422
+            assert response.json()["detail"][0]["loc"] == ["body", name]
+
+        response = lifespanned_client.post(
+            "/lab/bulk-predict-columnar", content=b"\x00" * 12,
+            headers={"content-type": "application/octet-stream"},
+        )
+        assert response.status_code == 422
+
+        response = lifespanned_client.post(
+            "/lab/bulk-predict-columnar", content=b"a,b", headers={"content-type": "text/csv"},
+        )
+        assert response.status_code == 415
+
+@pytest.mark.anyio
+async def test_ndjson_chunks_split_across_reads():
+    async def stream():
+        for data in (b'{"a": 1}\n{"a"', b': 2}\n\n{"a": 3}\n', b'{"a": 4}'):
+            yield data
+
+    chunks = [chunk async for chunk in housing_predict.ndjson_chunks(stream(), 2)]
+    assert chunks == [([1, 2], [{"a": 1}, {"a": 2}]), ([4, 5], [{"a": 3}, {"a": 4}])]
+
+def test_bulk_predict_stream(test_data_bulk, monkeypatch):
+    monkeypatch.setattr(housing_predict, "STREAM_CHUNK_ROWS", 1)
+    houses = test_data_bulk["houses"]
+    body = "\n".join(json.dumps(house) for house in houses) + "\n"
+
+    with TestClient(app) as lifespanned_client:
+        expected = lifespanned_client.post("/lab/bulk-predict", json=test_data_bulk).json()["predictions"]
+
+        response = lifespanned_client.post("/lab/bulk-predict-stream", content=body)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["prediction"] for line in lines] == expected
+
+        # bad first chunk is rejected up front
+        bad_first = json.dumps(dict(houses[0], Latitude=91)) + "\n" + json.dumps(houses[1])
+        response = lifespanned_client.post("/lab/bulk-predict-stream", content=bad_first)
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == ["body", 1, "Latitude"]
+
+        # a bad row after streaming started ends the stream with an error line
+        bad_later = json.dumps(houses[0]) + "\n" + json.dumps(dict(houses[1], MedInc=-1))
+        response = lifespanned_client.post("/lab/bulk-predict-stream", content=bad_later)
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0]["prediction"] == expected[0]
+        assert lines[1]["error"][0]["loc"] == ["body", 2, "MedInc"]
+
+def test_cache_hit_returns_stored_json_verbatim(test_data_single, fake_redis, monkeypatch):
+    with TestClient(app) as lifespanned_client:
+        monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+        response = lifespanned_client.post("/lab/predict", json=test_data_single)
+        (stored,) = fake_redis.store.values()
+        token, _ = prediction_cache.decode_value(stored)
+        assert response.content == b'{"prediction":' + token.encode() + b"}"
+
+        prediction_cache.l1.clear()
+        hit = lifespanned_client.post("/lab/predict", json=test_data_single)
+        assert hit.content == response.content
+        assert hit.headers["content-type"] == "application/json"
+
+@pytest.mark.anyio
+async def test_concurrent_misses_for_same_house_compute_once(monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", None)
+    prediction_cache.l1.clear()
+    calls = []
+
+    async def slow_predict(matrix):
+        calls.append(len(matrix))
+        await asyncio.sleep(0.01)
+        return [float(row[0]) for row in matrix]
+
+    matrix = np.array([[7.0, 41, 7, 1, 322, 2.5, 37.88, -122.23]])
+    results = await asyncio.gather(*(
+        housing_predict.cached_multi_predict_json(matrix, slow_predict) for _ in range(5)
+    ))
+
+    assert calls == [1]
+    assert results == [["7.0"]] * 5
+    assert prediction_cache.single_flight.in_flight == {}
+
+@pytest.mark.anyio
+async def test_cancelled_request_does_not_cancel_requests_sharing_its_keys(monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", None)
+    prediction_cache.l1.clear()
+    calls = []
+
+    async def slow_predict(matrix):
+        calls.append(len(matrix))
+        await asyncio.sleep(0.02)
+        return [float(row[0]) for row in matrix]
+
+    matrix = np.array([[6.0, 41, 7, 1, 322, 2.5, 37.88, -122.23]])
+    owner = asyncio.ensure_future(housing_predict.cached_multi_predict_json(matrix, slow_predict))
+    await asyncio.sleep(0)
+    waiters = [asyncio.ensure_future(housing_predict.cached_multi_predict_json(matrix, slow_predict)) for _ in range(3)]
+    await asyncio.sleep(0.005)
+    # the owner's client disconnects: one waiter takes over the computation
+    owner.cancel()
+    waiters[0].cancel()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1:] == [["6.0"], ["6.0"]]
+    assert calls == [1, 1]
+    assert prediction_cache.single_flight.in_flight == {}
+
+@pytest.mark.anyio
+async def test_redis_lock_waits_for_other_replica(fake_redis, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(prediction_cache, "REDIS_LOCK_ENABLED", True)
+    prediction_cache.l1.clear()
+    matrix = np.array([[8.0, 41, 7, 1, 322, 2.5, 37.88, -122.23]])
+    key = prediction_cache.feature_key(matrix[0])
+
+    # another replica holds the lock and writes the value shortly after
+    await fake_redis.set(key + b":lock", "1", px=1000)
+    async def other_replica():
+        await asyncio.sleep(0.05)
+        await fake_redis.set(key, prediction_cache.encode_value("1.5"))
+
+    async def must_not_predict(matrix):
+        raise AssertionError("value should come from the other replica")
+
+    _, result = await asyncio.gather(
+        other_replica(), housing_predict.cached_multi_predict_json(matrix, must_not_predict)
+    )
+    assert result == ["1.5"]
+
+@pytest.mark.anyio
+async def test_stale_while_revalidate_serves_stale_and_refreshes(fake_redis, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(prediction_cache, "CACHE_MODE", "swr")
+    prediction_cache.l1.clear()
+    matrix = np.array([[9.0, 41, 7, 1, 322, 2.5, 37.88, -122.23]])
+    key = prediction_cache.feature_key(matrix[0])
+    await fake_redis.set(key, prediction_cache.encode_value("1.5", 1000))  # soft deadline long past
+
+    async def must_not_predict(matrix):
+        raise AssertionError("stale entry should be served")
+
+    assert await housing_predict.cached_multi_predict_json(matrix, must_not_predict) == ["1.5"]
+    await asyncio.gather(*housing_predict._refresh_tasks)
+
+    token, stale = prediction_cache.decode_value(fake_redis.store[key])
+    assert token != "1.5"
+    assert not stale
+    assert fake_redis.expiry[key] - prediction_cache.time.monotonic() > prediction_cache.STALE_SECONDS
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("mode", ["ttl", "persistent"])
+async def test_cache_modes_set_expiry(fake_redis, monkeypatch, mode):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(prediction_cache, "CACHE_MODE", mode)
+    await prediction_cache.set_many({f"k{i}": "1.0" for i in range(50)})
+
+    if mode == "persistent":
+        assert fake_redis.expiry == {}
+    else:
+        ttls = [deadline - prediction_cache.time.monotonic() for deadline in fake_redis.expiry.values()]
+        low = prediction_cache.EXPIRE_SECONDS * (1 - prediction_cache.TTL_JITTER) - 2
+        high = prediction_cache.EXPIRE_SECONDS * (1 + prediction_cache.TTL_JITTER) + 1
+        assert all(low <= ttl <= high for ttl in ttls)
+        assert len({round(ttl) for ttl in ttls}) > 1
+
+def test_cache_namespace_is_model_content_hash(tmp_path):
+    with TestClient(app):
+        assert prediction_cache.model_version == model_fingerprint("model_pipeline.pkl")
+
+    retrained = tmp_path / "model_pipeline.pkl"
+    retrained.write_bytes(open("model_pipeline.pkl", "rb").read() + b"\0")
+    assert model_fingerprint(str(retrained)) != prediction_cache.model_version
+
+@pytest.mark.anyio
+async def test_purge_other_versions_keeps_current_keyspace(fake_redis, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(prediction_cache, "prefix", "w255-cache-prediction")
+    house = [1, 1, 3, 3, 3, 5, 1, 1]
+    monkeypatch.setattr(prediction_cache, "model_version", "old")
+    old_keys = [prediction_cache.feature_key(house), prediction_cache.feature_key(house[::-1])]
+    monkeypatch.setattr(prediction_cache, "CACHE_ENCODING", "text")
+    old_keys.append(prediction_cache.feature_key(house))
+    monkeypatch.setattr(prediction_cache, "CACHE_ENCODING", "binary")
+    monkeypatch.setattr(prediction_cache, "model_version", "new")
+    current = prediction_cache.feature_key(house)
+    for key in old_keys + [current, current + b":lock", b"unrelated"]:
+        await fake_redis.set(key, "1.0")
+
+    assert await prediction_cache.purge_other_versions() == 3
+    assert sorted(fake_redis.store) == sorted([current, current + b":lock", b"unrelated"])
+
+def test_startup_warmup_fills_cache_and_holds_readiness(tmp_path, fake_redis, monkeypatch):
+    houses = np.array([[i + 1, 41, 7, 1, 322, 2.5, 37.88, -122.23] for i in range(5)], dtype=float)
+    csv_path = tmp_path / "houses.csv"
+    csv_path.write_text(",".join(housing_predict.FEATURE_NAMES) + "\n"
+                        + "\n".join(",".join(map(str, row)) for row in houses[:3]))
+    npy_path = tmp_path / "houses.npy"
+    np.save(npy_path, houses[3:])
+    monkeypatch.setattr(warmup, "WARMUP_PATHS", [str(csv_path), str(npy_path)])
+    monkeypatch.setattr(warmup, "WARMUP_BATCH_ROWS", 2)
+    monkeypatch.setattr(prediction_cache, "connect", lambda *args, **kwargs: fake_redis)
+
+    monkeypatch.setattr(warmup, "progress", 0.5)
+    assert not warmup.ready()
+
+    with TestClient(app) as lifespanned_client:
+        for _ in range(100):
+            if lifespanned_client.get("/lab/ready").status_code == 200:
+                break
+        assert lifespanned_client.get("/lab/ready").json() == {"warmup_progress": 1.0}
+        assert len(fake_redis.store) == 5
+
+        counting_model = RowCountingModel(housing_predict.model)
+        monkeypatch.setattr(housing_predict, "model", counting_model)
+        house = dict(zip(housing_predict.FEATURE_NAMES, houses[4].tolist()))
+        assert lifespanned_client.post("/lab/predict", json=house).status_code == 200
+        assert counting_model.rows == []
+
+@pytest.mark.anyio
+async def test_warmup_leaves_the_event_loop_free(fake_redis, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(warmup, "KEY_CHUNK_ROWS", 10)
+    prediction_cache.l1.clear()
+    houses = np.array([[i + 1, 41, 7, 1, 322, 2.5, 37.88, -122.23] for i in range(50)], dtype=float)
+    ticks = []
+    done = False
+
+    async def ticker():
+        while not done:
+            ticks.append(len(ticks))
+            await asyncio.sleep(0)
+
+    def slow_load(paths):
+        time.sleep(0.1)
+        return houses
+
+    seen = []
+    feature_key = prediction_cache.feature_key
+
+    def recording_feature_key(row):
+        seen.append(len(ticks))
+        return feature_key(row)
+
+    async def predict(matrix):
+        return matrix[:, 0].tolist()
+
+    monkeypatch.setattr(warmup, "load_all_houses", slow_load)
+    monkeypatch.setattr(prediction_cache, "feature_key", recording_feature_key)
+    ticking = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    await warmup.run(["houses.npy"], predict)
+    done = True
+    await ticking
+    # the file was loaded off the loop and keys were hashed in 5 chunks with
+    # the loop running in between
+    assert seen[0] > 10
+    assert len(set(seen)) == 5
+    assert len(fake_redis.store) == 50
+
+def test_recent_houses_are_saved_for_next_warmup(tmp_path, test_data_single, monkeypatch):
+    record_path = tmp_path / "recent.npy"
+    monkeypatch.setattr(warmup, "WARMUP_RECORD_PATH", str(record_path))
+    monkeypatch.setattr(warmup, "recent_rows", warmup.deque(maxlen=10))
+    with TestClient(app) as lifespanned_client:
+        monkeypatch.setattr(prediction_cache, "redis", None)
+        lifespanned_client.post("/lab/predict", json=test_data_single)
+
+    saved = warmup.load_houses(str(record_path))
+    assert saved.tolist() == [list(housing_predict.House(**test_data_single).features())]
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("encoding, dtype, key_len, value_len", [
+    ("binary", "f8", 42, 8), ("binary", "f4", 42, 4), ("text", "f8", 67, None),
+])
+async def test_cache_encodings_round_trip(fake_redis, monkeypatch, encoding, dtype, key_len, value_len):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(prediction_cache, "prefix", "w255-cache-prediction")
+    monkeypatch.setattr(prediction_cache, "model_version", "0123456789ab")
+    monkeypatch.setattr(prediction_cache, "CACHE_ENCODING", encoding)
+    monkeypatch.setattr(prediction_cache, "CACHE_VALUE_DTYPE", dtype)
+    prediction_cache.l1.clear()
+    matrix = np.array([[12.0, 41, 7, 1, 322, 2.5, 37.88, -122.23], [13.0, 41, 7, 1, 322, 2.5, 37.88, -122.23]])
+    async def predict(matrix):
+        return [2.5299999713897705, 1 / 3]
+
+    missed = await housing_predict.cached_multi_predict_json(matrix, predict)
+    prediction_cache.l1.clear()
+    hit = await housing_predict.cached_multi_predict_json(matrix, predict)
+
+    assert hit == missed
+    assert json.loads(missed[0]) == pytest.approx(2.53, rel=1e-7)
+    assert {len(key) for key in fake_redis.store} == {key_len}
+    if value_len is not None:
+        assert {len(value) for value in fake_redis.store.values()} == {value_len}
+    if dtype == "f4":
+        assert missed == ["2.53", "0.33333334"]
+
+@pytest.mark.anyio
+async def test_eviction_policy_is_checked_and_configured(fake_redis, monkeypatch, caplog):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    assert await prediction_cache.check_eviction() == {"maxmemory": 0, "maxmemory_policy": "noeviction"}
+    assert "cannot evict cached predictions" in caplog.text
+
+    caplog.clear()
+    monkeypatch.setattr(prediction_cache, "REDIS_CONFIGURE_EVICTION", True)
+    monkeypatch.setattr(prediction_cache, "REDIS_MAXMEMORY", "167772160")
+    assert await prediction_cache.check_eviction() == {"maxmemory": 167772160, "maxmemory_policy": "allkeys-lfu"}
+    assert "cannot evict" not in caplog.text
+
+def test_cache_stats_report_endpoints_and_redis_memory(test_data_single, test_data_bulk, fake_redis, monkeypatch):
+    with TestClient(app) as lifespanned_client:
+        monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+        lifespanned_client.post("/lab/predict", json=test_data_single)
+        lifespanned_client.post("/lab/predict", json=test_data_single)
+        lifespanned_client.post("/lab/bulk-predict", json=test_data_bulk)
+        asyncio.run(prediction_cache.refresh_info())
+        stats = lifespanned_client.get("/lab/cache-stats").json()
+
+    assert stats["endpoints"]["predict"] == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+    # the first bulk house is the single one
+    assert stats["endpoints"]["bulk-predict"] == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+    assert stats["redis_server"]["keys"] == len(fake_redis.store)
+    assert stats["redis_server"]["bytes_per_key"] > 0
+    assert stats["redis_server"]["maxmemory_policy"] == "noeviction"
+
+def test_metrics_endpoint_exposes_stages_and_cache_counters(test_data_single, test_data_bulk, fake_redis, monkeypatch):
+    with TestClient(app) as lifespanned_client:
+        monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+        lifespanned_client.post("/lab/predict", json=test_data_single)
+        lifespanned_client.post("/lab/bulk-predict", json=test_data_bulk)
+        lifespanned_client.get("/lab/not-a-route")
+        response = lifespanned_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = dict(line.rsplit(" ", 1) for line in response.text.splitlines() if not line.startswith("#"))
+    for stage in ("parse", "cache_key", "cache_read", "predict", "cache_write"):
+        assert int(samples[f'prediction_stage_duration_seconds_count{{stage="{stage}"}}']) >= 1
+    assert int(samples['prediction_batch_rows_bucket{source="request",le="2"}']) >= 2
+    assert int(samples['prediction_batch_rows_count{source="model"}']) >= 2
+    assert samples['prediction_cache_lookups_total{endpoint="predict",result="miss"}'] == "1"
+    assert samples['prediction_cache_lookups_total{endpoint="bulk-predict",result="hit"}'] == "1"
+    assert int(samples['http_request_duration_seconds_count{path="/lab/bulk-predict"}']) >= 1
+    assert int(samples['http_request_duration_seconds_count{path="other"}']) >= 1
+    assert samples["http_requests_in_flight"] == "1"  # the scrape itself
+    assert samples["inference_in_flight"] == "0"
+
+def test_histogram_buckets_are_cumulative():
+    latency = metrics.Metric("test_latency_seconds", "Test", "histogram", ["stage"], [0.1, 1])
+    metrics.registry.remove(latency)
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.labels("a").observe(value)
+
+    assert list(latency.render())[2:] == [
+        'test_latency_seconds_bucket{stage="a",le="0.1"} 2',
+        'test_latency_seconds_bucket{stage="a",le="1"} 3',
+        'test_latency_seconds_bucket{stage="a",le="+Inf"} 4',
+        'test_latency_seconds_sum{stage="a"} 3.65',
+        'test_latency_seconds_count{stage="a"} 4',
+    ]
+
+@pytest.mark.anyio
+async def test_circuit_breaker_bypasses_failing_redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(prediction_cache, "breaker", prediction_cache.CircuitBreaker(3, 0.05))
+    calls = []
+    down = [True]
+    def flaky(method):
+        async def call(*args, **kwargs):
+            calls.append(method.__name__)
+            if down[0]:
+                raise prediction_cache.RedisError("Timeout reading from redis")
+            return await method(*args, **kwargs)
+        return call
+    monkeypatch.setattr(fake_redis, "mget", flaky(fake_redis.mget))
+    pipeline_class = type(fake_redis.pipeline())
+    monkeypatch.setattr(pipeline_class, "execute", flaky(pipeline_class.execute))
+    matrix = np.array([[10.0, 41, 7, 1, 322, 2.5, 37.88, -122.23]])
+    async def predict(matrix):
+        return [2.5]
+
+    for _ in range(5):
+        prediction_cache.l1.clear()
+        assert await housing_predict.cached_multi_predict_json(matrix, predict) == ["2.5"]
+    # read, write, read trip it, after that Redis is not touched
+    assert calls == ["mget", "execute", "mget"]
+    assert prediction_cache.breaker.state == "open"
+
+    # after the reset window one probe is let through and closes it again
+    down[0] = False
+    await asyncio.sleep(0.06)
+    prediction_cache.l1.clear()
+    assert await housing_predict.cached_multi_predict_json(matrix, predict) == ["2.5"]
+    assert prediction_cache.breaker.state == "closed"
+    assert fake_redis.store == {prediction_cache.feature_key(matrix[0]): prediction_cache.encode_value("2.5")}
+
+@pytest.mark.anyio
+async def test_cancelled_probe_does_not_keep_the_breaker_open(fake_redis, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    breaker = prediction_cache.CircuitBreaker(1, 0.05)
+    monkeypatch.setattr(prediction_cache, "breaker", breaker)
+    breaker.record_failure()
+    await asyncio.sleep(0.06)
+    started = asyncio.Event()
+
+    async def hanging_mget(keys):
+        started.set()
+        await asyncio.sleep(10)
+
+    mget = fake_redis.mget
+    monkeypatch.setattr(fake_redis, "mget", hanging_mget)
+    prediction_cache.l1.clear()
+    probe = asyncio.ensure_future(prediction_cache.get_many([b"k"]))
+    await started.wait()
+    assert breaker.state == "half-open"
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    # the next call probes again and closes the breaker
+    monkeypatch.setattr(fake_redis, "mget", mget)
+    assert await prediction_cache.get_many([b"k"]) == ([None], [])
+    assert breaker.state == "closed"
+
+    # a probe lost before its round trip is given up after a reset window
+    breaker.record_failure()
+    await asyncio.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    await asyncio.sleep(0.06)
+    assert breaker.allow()
+
+@pytest.mark.anyio
+async def test_write_back_releases_locks_in_same_round_trip(fake_redis, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(prediction_cache, "REDIS_LOCK_ENABLED", True)
+    prediction_cache.l1.clear()
+    executed = []
+    pipeline = fake_redis.pipeline
+    def counting_pipeline(transaction=True):
+        pipe = pipeline(transaction)
+        executed.append(pipe)
+        return pipe
+    monkeypatch.setattr(fake_redis, "pipeline", counting_pipeline)
+    matrix = np.array([[11.0, 41, 7, 1, 322, 2.5, 37.88, -122.23]])
+    key = prediction_cache.feature_key(matrix[0])
+
+    async def predict(matrix):
+        return [3.5]
+
+    assert await housing_predict.cached_multi_predict_json(matrix, predict) == ["3.5"]
+    # one pipeline for the lock, one for the value plus unlock
+    assert len(executed) == 2
+    assert fake_redis.store == {key: prediction_cache.encode_value("3.5")}
+
+@pytest.mark.anyio
+async def test_large_batches_are_split_into_bounded_round_trips(fake_redis, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(prediction_cache, "REDIS_BATCH_KEYS", 2)
+    prediction_cache.l1.clear()
+    mget_sizes, pipeline_sizes = [], []
+    pipeline_class = type(fake_redis.pipeline())
+    mget, execute = fake_redis.mget, pipeline_class.execute
+
+    async def counting_mget(keys):
+        mget_sizes.append(len(keys))
+        return await mget(keys)
+
+    async def counting_execute(pipe):
+        pipeline_sizes.append(len(pipe.commands))
+        return await execute(pipe)
+
+    monkeypatch.setattr(fake_redis, "mget", counting_mget)
+    monkeypatch.setattr(pipeline_class, "execute", counting_execute)
+    matrix = np.array([[12.0 + i, 41, 7, 1, 322, 2.5, 37.88, -122.23] for i in range(5)])
+
+    async def predict(rows):
+        return rows[:, 0].tolist()
+
+    first = await housing_predict.cached_multi_predict_json(matrix, predict)
+    assert mget_sizes == [2, 2, 1]
+    assert pipeline_sizes == [2, 2, 1]
+    prediction_cache.l1.clear()
+    assert await housing_predict.cached_multi_predict_json(matrix, predict) == first
+    assert prediction_cache.breaker.state == "closed"
+
+def test_redis_client_has_bounded_pool_and_timeouts():
+    client = prediction_cache.connect("redis://localhost:6379", max_connections=4)
+    pool = client.connection_pool
+    assert pool.max_connections == 4
+    assert pool.timeout == prediction_cache.REDIS_POOL_TIMEOUT_MS / 1000
+    assert pool.connection_kwargs["socket_timeout"] == prediction_cache.REDIS_SOCKET_TIMEOUT_MS / 1000
+    assert pool.connection_kwargs["socket_connect_timeout"] == prediction_cache.REDIS_CONNECT_TIMEOUT_MS / 1000
+
+def test_benchmark_reports_latency_percentiles(tmp_path):
+    from trainer import benchmark
+
+    output = tmp_path / "run.json"
+    benchmark.main([
+        "--mix", "single:3,bulk10:1", "--requests", "40", "--concurrency", "4",
+        "--hit-ratio", "0.5", "--hot-houses", "20", "--output", str(output),
+    ])
+    report = json.loads(output.read_text())
+
+    assert report["overall"]["requests"] == 40
+    assert report["overall"]["errors"] == 0
+    assert set(report["by_payload"]) == {"single", "bulk10"}
+    latency = report["overall"]["latency_ms"]
+    assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    assert 0 < report["cache"]["hit_ratio"] < 1
+
+def test_prefork_server_shares_preloaded_model(tmp_path):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, WEB_WORKERS="2", HOST="127.0.0.1", PORT=str(port),
+               REDIS_URL="redis://localhost:1", REDIS_MAX_CONNECTIONS_TOTAL="8")
+    server = subprocess.Popen([sys.executable, "-m", "src.serve"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        for _ in range(100):
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/lab/health", timeout=1) as response:
+                    assert response.status == 200
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            pytest.fail("pre-fork server did not start")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        _, stderr = server.communicate(timeout=10)
+    assert server.returncode == 0, stderr
+    assert "with 2 workers" in stderr
+    assert stderr.count("Application shutdown complete") == 2
+
+def test_only_worker_zero_runs_once_per_pod_work(tmp_path, monkeypatch):
+    houses = str(tmp_path / "houses.npy")
+    np.save(houses, np.array([[8.0, 41, 7, 1, 322, 2.5, 37.88, -122.23]]))
+    started = []
+
+    async def record(name):
+        started.append(name)
+
+    monkeypatch.setattr(prediction_cache, "purge_other_versions", lambda: record("purge"))
+    monkeypatch.setattr(prediction_cache, "monitor_redis", lambda: record("monitor"))
+    monkeypatch.setattr(warmup, "run", lambda paths, predict: record("warm-up"))
+    monkeypatch.setattr(warmup, "WARMUP_PATHS", [houses])
+    monkeypatch.setattr(warmup, "shared_progress", None)
+    warmup.share_progress()
+    assert not warmup.ready()
+
+    monkeypatch.setattr(housing_predict, "worker_number", 1)
+    with TestClient(app) as client:
+        # worker 0 publishes its warm-up progress to the others
+        assert client.get("/lab/ready").status_code == 503
+        warmup._set_progress(1.0)
+        assert client.get("/lab/ready").status_code == 200
+    assert started == []
+
+    monkeypatch.setattr(housing_predict, "worker_number", 0)
+    with TestClient(app):
+        pass
+    assert sorted(started) == ["monitor", "purge", "warm-up"]
+
+def test_redis_pool_is_split_across_workers(monkeypatch):
+    assert serve.redis_connections_per_worker(32, 4) == 8
+    assert serve.redis_connections_per_worker(2, 4) == 1
+    monkeypatch.setattr(prediction_cache, "REDIS_MAX_CONNECTIONS", 8)
+    assert prediction_cache.connect("redis://localhost:6379").connection_pool.max_connections == 8
+
+def test_workers_that_keep_failing_back_off_then_stop_the_server():
+    restarts = serve.WorkerRestarts(min_uptime=30, max_quick_exits=4, delay=1, max_delay=3)
+    assert [restarts.record_exit(0, 2) for _ in range(3)] == [1, 2, 3]
+    assert restarts.record_exit(1, 2) == 1
+    # a worker that ran for a while starts counting again
+    assert restarts.record_exit(0, 600) == 0
+    assert [restarts.record_exit(0, 2) for _ in range(4)] == [1, 2, 3, None]
+
+def test_worker_reports_a_failed_startup():
+    failing = FastAPI(lifespan=failing_lifespan)
+    assert serve._run_worker(failing, None) == serve.STARTUP_FAILURE
+
+@asynccontextmanager
+async def failing_lifespan(app):
+    raise RuntimeError("model not found")
+    yield
+
+def test_training_search_halves_candidates_and_resumes(tmp_path, monkeypatch):
+    from trainer import train
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(270, 8))
+    y = X[:, 0] - X[:, 6] + rng.normal(scale=0.1, size=270)
+    candidates = [{"svr__C": C, "svr__gamma": gamma} for C in (0.1, 1.0, 10.0) for gamma in (0.01, 0.1, 1.0)]
+    results = str(tmp_path / "results.jsonl")
+    evaluated = []
+    evaluate = train.evaluate
+
+    def counting_evaluate(model, params, *args):
+        evaluated.append(params)
+        return evaluate(model, params, *args)
+
+    def search():
+        return train.search(
+            X, y, candidates, folds=3, results_path=results, cache_dir=str(tmp_path / "cache"), jobs=1,
+            log=lambda line: None,
+        )
+
+    monkeypatch.setattr(train, "evaluate", counting_evaluate)
+
+    best = search()
+    # 9 candidates on 90 rows, the best 3 on all 270
+    assert len(evaluated) == 12
+    with open(results) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["rows"] for line in lines] == [90] * 9 + [270] * 3
+    assert all(line["seconds"] >= 0 and len(line["fold_scores"]) == 3 for line in lines)
+    assert train.candidate_key(best["params"]) == max(lines[9:], key=lambda line: line["mean_score"])["candidate"]
+
+    # interrupted after five candidates, with the last line half written
+    with open(results, "w") as f:
+        f.writelines(json.dumps(line) + "\n" for line in lines[:5])
+        f.write(json.dumps(lines[5])[:20])
+    evaluated.clear()
+    assert search() == best
+    assert len(evaluated) == 7
+
+def test_training_refuses_to_overwrite_model(tmp_path):
+    from trainer import train
+
+    existing = tmp_path / "model_pipeline.pkl"
+    existing.write_bytes(b"trained")
+    with pytest.raises(SystemExit, match="--force"):
+        train.main(["--output", str(existing)])
+    assert existing.read_bytes() == b"trained"
+
+@pytest.fixture(scope="module")
+def pipeline():
+    return joblib.load("model_pipeline.pkl")
+
+@pytest.fixture(scope="module")
+def realistic_houses(pipeline):
+    # perturbed support vectors mapped back to raw feature space
+    scaler, svr = pipeline.steps[1][1], pipeline.steps[2][1]
+    rng = np.random.default_rng(0)
+    rows = svr.support_vectors_[rng.choice(len(svr.support_vectors_), 300)]
+    rows = rows + rng.normal(scale=0.05, size=rows.shape)
+    return rows * scaler.scale_ + scaler.center_
+
+def test_numpy_engine_matches_pipeline(pipeline, realistic_houses):
+    expected = pipeline.predict(realistic_houses)
+    exact = build_engine(pipeline, "numpy", dtype="float64")
+    np.testing.assert_allclose(exact.predict(realistic_houses), expected, rtol=0, atol=1e-8)
+
+    with_missing = realistic_houses[:5].copy()
+    with_missing[:, 2] = np.nan
+    np.testing.assert_allclose(exact.predict(with_missing), pipeline.predict(with_missing), atol=1e-8)
+
+    single = build_engine(pipeline, "numpy", dtype="float32")
+    np.testing.assert_allclose(single.predict(realistic_houses), expected, rtol=0, atol=0.05)
+
+def test_compiled_pipeline_matches_pipeline(pipeline, realistic_houses):
+    fused = compile_pipeline(pipeline, block_size=64)
+    # exercises both the single block and the multi block paths
+    for rows in (realistic_houses[:1], realistic_houses):
+        np.testing.assert_allclose(fused.predict(rows), pipeline.predict(rows), rtol=0, atol=1e-8)
+
+    with_missing = realistic_houses[:5].copy()
+    with_missing[0, 0] = np.nan
+    with_missing[3, 7] = np.nan
+    np.testing.assert_allclose(fused.predict(with_missing), pipeline.predict(with_missing), atol=1e-8)
+
+def test_api_serves_compiled_pipeline_by_default():
+    with TestClient(app):
+        assert isinstance(housing_predict.model, FusedSVRPipeline)
+
+def test_compiled_artifact_is_memory_mapped_and_matches(pipeline, realistic_houses, tmp_path, monkeypatch):
+    artifact = str(tmp_path / "model_fused")
+    compiled = svr_engine.compile_artifact("model_pipeline.pkl", artifact)
+    loaded = svr_engine.load_model(artifact)
+
+    np.testing.assert_array_equal(loaded.predict(realistic_houses), compiled.predict(realistic_houses))
+    assert isinstance(loaded.support_t.base, np.memmap)
+    assert not loaded.support_t.flags.writeable
+    assert model_fingerprint(artifact) == model_fingerprint("model_pipeline.pkl")
+
+    monkeypatch.setattr(svr_engine, "MODEL_ENGINE", "numpy")
+    with pytest.raises(ValueError, match="MODEL_ENGINE=fused"):
+        svr_engine.load_model(artifact)
+
+def test_serving_compiled_artifact_skips_sklearn_import(tmp_path):
+    artifact = str(tmp_path / "model_fused")
+    svr_engine.compile_artifact("model_pipeline.pkl", artifact)
+    code = (
+        "import sys; from fastapi.testclient import TestClient; from src.main import app\n"
+        "with TestClient(app) as client:\n"
+        "    assert client.get('/lab/health').status_code == 200\n"
+        "    assert 'startup_phase_seconds{phase=\"model_load\"}' in client.get('/metrics').text\n"
+        "assert 'sklearn' not in sys.modules, 'sklearn was imported'\n"
+    )
+    env = dict(os.environ, MODEL_PATH=artifact, REDIS_URL="redis://localhost:1")
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def shifted_pipeline(pipeline, shift):
+    shifted = copy.deepcopy(pipeline)
+    svr = shifted.steps[2][1]
+    svr.intercept_ = svr.intercept_ + shift
+    return shifted
+
+def test_admin_reload_swaps_model_and_cache_namespace(pipeline, test_data_bulk, fake_redis, tmp_path, monkeypatch):
+    model_path = str(tmp_path / "model.pkl")
+    joblib.dump(pipeline, model_path)
+    monkeypatch.setattr(housing_predict, "MODEL_PATH", model_path)
+    monkeypatch.setattr(housing_predict, "MODEL_ADMIN_TOKEN", "secret")
+    auth = {"Authorization": "Bearer secret"}
+    with TestClient(app) as client:
+        monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+        first = client.post("/lab/bulk-predict", json=test_data_bulk)
+        old_version = first.headers["X-Model-Version"]
+        assert client.post("/lab/admin/reload-model").status_code == 403
+        assert client.post("/lab/admin/reload-model", headers=auth).json() == {
+            "model_version": old_version, "reloaded": False,
+        }
+
+        joblib.dump(shifted_pipeline(pipeline, 1.0), model_path)
+        reloaded = client.post("/lab/admin/reload-model", headers=auth).json()
+        assert reloaded["reloaded"] and reloaded["model_version"] != old_version
+
+        second = client.post("/lab/bulk-predict", json=test_data_bulk)
+        assert second.headers["X-Model-Version"] == reloaded["model_version"]
+        np.testing.assert_allclose(
+            second.json()["predictions"], np.add(first.json()["predictions"], 1.0), rtol=0, atol=1e-6,
+        )
+        # the old version's entries are purged in the background
+        assert all(key.startswith(prediction_cache.key_head()) for key in fake_redis.store)
+
+def test_admin_reload_keeps_serving_model_that_fails_validation(pipeline, tmp_path, monkeypatch):
+    model_path = str(tmp_path / "model.pkl")
+    joblib.dump(pipeline, model_path)
+    monkeypatch.setattr(housing_predict, "MODEL_PATH", model_path)
+    monkeypatch.setattr(housing_predict, "MODEL_ADMIN_TOKEN", "secret")
+    with TestClient(app) as client:
+        assert client.post("/lab/admin/reload-model").status_code == 403
+        serving, version = housing_predict.model, prediction_cache.model_version
+        joblib.dump(shifted_pipeline(pipeline, np.nan), model_path)
+        response = client.post("/lab/admin/reload-model", headers={"Authorization": "Bearer secret"})
+        assert response.status_code == 422
+        assert housing_predict.model is serving
+        assert prediction_cache.model_version == version
+
+    monkeypatch.setattr(housing_predict, "MODEL_ADMIN_TOKEN", "")
+    with TestClient(app) as client:
+        assert client.post("/lab/admin/reload-model").status_code == 404
+
+def test_admin_reload_respects_pinned_version_and_workers(pipeline, tmp_path, monkeypatch):
+    model_path = str(tmp_path / "model.pkl")
+    joblib.dump(pipeline, model_path)
+    monkeypatch.setattr(housing_predict, "MODEL_PATH", model_path)
+    monkeypatch.setattr(housing_predict, "MODEL_VERSION", "v1")
+    monkeypatch.setattr(housing_predict, "MODEL_ADMIN_TOKEN", "secret")
+    auth = {"Authorization": "Bearer secret"}
+    with TestClient(app) as client:
+        assert client.post("/lab/admin/reload-model", headers=auth).json() == {"model_version": "v1", "reloaded": False}
+        assert prediction_cache.model_version == "v1"
+
+        monkeypatch.setattr(housing_predict, "worker_count", 2)
+        response = client.post("/lab/admin/reload-model", headers=auth)
+        assert response.status_code == 409
+        assert "MODEL_RELOAD_INTERVAL_SECONDS" in response.json()["detail"]
+
+@pytest.mark.anyio
+async def test_predictions_computed_across_a_model_swap_are_not_cached(fake_redis, monkeypatch):
+    monkeypatch.setattr(prediction_cache, "redis", fake_redis)
+    monkeypatch.setattr(housing_predict, "model", housing_predict.model)
+    monkeypatch.setattr(prediction_cache, "model_version", prediction_cache.model_version)
+    monkeypatch.setattr(housing_predict, "model_generation", housing_predict.model_generation)
+    prediction_cache.l1.clear()
+    matrix = np.array([[7.0, 41, 7, 1, 322, 2.5, 37.88, -122.23]])
+
+    async def swapping_predict(rows):
+        housing_predict.swap_model(housing_predict.model, "", "next-version")
+        return [1.5] * len(rows)
+
+    assert await housing_predict.cached_multi_predict_json(matrix, swapping_predict) == ["1.5"]
+    assert fake_redis.store == {}
+    assert not prediction_cache.l1.entries
+
+@pytest.mark.anyio
+async def test_model_watcher_reloads_changed_file(pipeline, tmp_path, monkeypatch):
+    model_path = str(tmp_path / "model.pkl")
+    joblib.dump(pipeline, model_path)
+    monkeypatch.setattr(housing_predict, "model", housing_predict.model)
+    monkeypatch.setattr(prediction_cache, "model_version", prediction_cache.model_version)
+    registry = housing_predict.ModelRegistry()
+    registry.serving(model_path, model_fingerprint(model_path), model_fingerprint(model_path))
+    watcher = asyncio.ensure_future(registry.watch(0.01))
+    try:
+        joblib.dump(shifted_pipeline(pipeline, 1.0), model_path)
+        for _ in range(500):
+            if registry.version == model_fingerprint(model_path):
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        watcher.cancel()
+    assert prediction_cache.model_version == registry.version == model_fingerprint(model_path)
+    assert housing_predict.model.intercept == pytest.approx(pipeline.steps[2][1].intercept_[0] + 1.0)
+
+def test_prediction_index_serves_cells_within_tolerance(pipeline, realistic_houses, tmp_path):
+    from trainer import build_index
+
+    fingerprint = model_fingerprint("model_pipeline.pkl")
+    built = build_index.build_index(compile_pipeline(pipeline), realistic_houses, fingerprint, samples=4)
+    path = str(tmp_path / "index.npz")
+    built.save(path)
+    index = prediction_index.load_index(path, fingerprint, tolerance=0.05)
+    assert 0 < len(index.codes) <= len(realistic_houses)
+
+    values, found = index.lookup(realistic_houses)
+    assert found.any()
+    error = np.abs(values[found] - pipeline.predict(realistic_houses[found]))
+    assert error.max() <= 0.05
+
+    outside = realistic_houses[:3].copy()
+    outside[0, 0] = np.nan
+    outside[1, 4] = 1e9
+    outside[2, 6] = 0.0
+    assert not index.lookup(outside)[1].any()
+    assert prediction_index.load_index(path, "another-model") is None
+
+def test_api_answers_indexed_houses_without_the_model(pipeline, realistic_houses, test_data_bulk, monkeypatch):
+    from trainer import build_index
+
+    index = build_index.build_index(
+        compile_pipeline(pipeline), realistic_houses, model_fingerprint("model_pipeline.pkl"), samples=4,
+    )
+    indexed = realistic_houses[index.lookup(realistic_houses)[1]][0]
+    outside = dict(test_data_bulk["houses"][0], Population=1e6)
+    with TestClient(app) as client:
+        monkeypatch.setattr(prediction_cache, "redis", None)
+        monkeypatch.setattr(housing_predict, "grid_index", index)
+        counting_model = RowCountingModel(housing_predict.model)
+        monkeypatch.setattr(housing_predict, "model", counting_model)
+        houses = [dict(zip(build_index.FEATURE_NAMES, indexed.tolist())), outside]
+        response = client.post("/lab/bulk-predict", json={"houses": houses})
+
+        assert response.status_code == 200
+        assert counting_model.rows == [1]
+        assert response.json()["predictions"][0] == index.lookup(indexed[None])[0][0]
+        assert client.get("/lab/cache-stats").json()["index"]["hits"] >= 1
+
+def test_nystroem_engine_error_budget(pipeline, realistic_houses):
+    approximate = build_engine(pipeline, "nystroem", dtype="float64", n_components=1000)
+    error = np.abs(approximate.predict(realistic_houses) - pipeline.predict(realistic_houses))
+    # measured: mean about 0.04, max about 1.7 ($100k units)
+    assert error.mean() <= 0.08
+    assert error.max() <= min(2.0, approximate.error_bound())
+
+def test_inexact_engines_get_their_own_cache_namespace(monkeypatch):
+    fingerprint = model_fingerprint("model_pipeline.pkl")
+    assert svr_engine.model_version("model_pipeline.pkl") == fingerprint
+    monkeypatch.setattr(svr_engine, "MODEL_ENGINE", "nystroem")
+    assert svr_engine.model_version("model_pipeline.pkl") == fingerprint + "+nystroem-float64-1000"
+    monkeypatch.setattr(svr_engine, "MODEL_ENGINE", "numpy")
+    monkeypatch.setattr(svr_engine, "MODEL_ENGINE_DTYPE", "float32")
+    assert svr_engine.model_version("model_pipeline.pkl") == fingerprint + "+numpy-float32"
+
+def test_build_engine_rejects_unknown_engine(pipeline):
+    with pytest.raises(ValueError):
+        build_engine(pipeline, "gpu")
+    with pytest.raises(ValueError):
+        build_engine(pipeline, "rff")
+
 @pytest.fixture
 def anyio_backend():
     return "asyncio"
@@ -0,0 +1,200 @@
+# Throughput and latency benchmark for the prediction API.
+#
+# Drives the ASGI app in-process through httpx (no sockets, so the numbers are
+# the service's own cost) with a weighted mix of payloads at a fixed
+# concurrency, and prints one JSON document that can be saved and diffed
+# between runs:
+#
+#   python -m trainer.benchmark --mix single:8,bulk10:1,bulk1k:1 \
+#       --concurrency 16 --requests 2000 --hit-ratio 0.8 --output run.json
+#
+# --hit-ratio is the share of houses drawn from a hot set that is predicted
+# (and so cached) before timing starts; the rest are new random houses.
+# --redis is "none" (in-process L1 only), "fake" (fakeredis, if installed) or
+# a redis:// URL. Request bodies are built before timing starts, so keep the
+# request count low for bulk100k.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+# payload name -> (endpoint, houses per request)
+PAYLOADS = {
+    "single": ("/lab/predict", 1),
+    "bulk10": ("/lab/bulk-predict", 10),
+    "bulk1k": ("/lab/bulk-predict", 1000),
+    "bulk100k": ("/lab/bulk-predict", 100000),
+}
+FEATURE_NAMES = ("MedInc", "HouseAge", "AveRooms", "AveBedrms", "Population", "AveOccup", "Latitude", "Longitude")
+# plausible California ranges for each feature
+FEATURE_LOW = np.array([0.5, 1, 2, 0.8, 100, 1.5, 32.6, -124.3])
+FEATURE_HIGH = np.array([15, 52, 10, 2, 5000, 5, 41.9, -114.4])
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition(":")
+        if name not in PAYLOADS:
+            raise argparse.ArgumentTypeError(f"unknown payload {name!r}, use one of {', '.join(PAYLOADS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def random_houses(rng: np.random.Generator, n: int) -> np.ndarray:
+    return FEATURE_LOW + rng.random((n, len(FEATURE_NAMES))) * (FEATURE_HIGH - FEATURE_LOW)
+
+
+def sample_houses(rng: np.random.Generator, hot: np.ndarray, n: int, hit_ratio: float) -> np.ndarray:
+    rows = random_houses(rng, n)
+    from_hot = rng.random(n) < hit_ratio
+    rows[from_hot] = hot[rng.integers(len(hot), size=int(from_hot.sum()))]
+    return rows
+
+
+def request_body(kind: str, rows: np.ndarray) -> bytes:
+    houses = [dict(zip(FEATURE_NAMES, row)) for row in rows.tolist()]
+    return json.dumps(houses[0] if kind == "single" else {"houses": houses}).encode()
+
+
+def latency_summary(seconds: List[float]) -> dict:
+    if not seconds:
+        return {}
+    ms = np.array(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3),
+        "mean": round(ms.mean(), 3), "max": round(ms.max(), 3),
+    }
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    # samples are (rows, seconds, status) tuples
+    ok = [seconds for _, seconds, status in samples if status == 200]
+    rows = sum(rows for rows, _, status in samples if status == 200)
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "rows": rows,
+        "requests_per_second": round(len(ok) / elapsed, 2),
+        "rows_per_second": round(rows / elapsed, 2),
+        "latency_ms": latency_summary(ok),
+    }
+
+
+def _use_redis(target: str) -> None:
+    # called inside the app lifespan, replaces the client it connected
+    from src import prediction_cache
+
+    if target == "none":
+        prediction_cache.redis = None
+    elif target == "fake":
+        try:
+            import fakeredis
+        except ImportError:
+            sys.exit("--redis fake needs the fakeredis package")
+        prediction_cache.redis = fakeredis.FakeAsyncRedis()
+
+
+async def run(
+    mix: Dict[str, float],
+    concurrency: int = 8,
+    requests: int = 1000,
+    hit_ratio: float = 0.0,
+    hot_houses: int = 1000,
+    redis: str = "none",
+    seed: int = 0,
+) -> dict:
+    if redis not in ("none", "fake"):
+        os.environ["REDIS_URL"] = redis
+    from src import prediction_cache
+    from src.main import app
+
+    rng = np.random.default_rng(seed)
+    names = list(mix)
+    weights = np.array([mix[name] for name in names]) / sum(mix.values())
+    kinds = [names[i] for i in rng.choice(len(names), size=requests, p=weights)]
+    hot = random_houses(rng, hot_houses)
+    bodies = [request_body(kind, sample_houses(rng, hot, PAYLOADS[kind][1], hit_ratio)) for kind in kinds]
+    headers = {"content-type": "application/json"}
+
+    async with app.router.lifespan_context(app):
+        _use_redis(redis)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            if hit_ratio > 0:
+                for start in range(0, len(hot), 1000):
+                    warm = request_body("bulk1k", hot[start:start + 1000])
+                    (await client.post("/lab/bulk-predict", content=warm, headers=headers)).raise_for_status()
+            stats_before = prediction_cache.stats()
+
+            samples: Dict[str, list] = {name: [] for name in names}
+            pending = iter(range(requests))
+
+            async def worker():
+                for i in pending:
+                    path, rows = PAYLOADS[kinds[i]]
+                    start = time.perf_counter()
+                    response = await client.post(path, content=bodies[i], headers=headers)
+                    samples[kinds[i]].append((rows, time.perf_counter() - start, response.status_code))
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            stats_after = prediction_cache.stats()
+
+    def served(stats: dict) -> Dict[str, int]:
+        hits = sum(endpoint["hits"] for endpoint in stats["endpoints"].values())
+        misses = sum(endpoint["misses"] for endpoint in stats["endpoints"].values())
+        return {"hits": hits, "misses": misses}
+
+    before, after = served(stats_before), served(stats_after)
+    hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+    return {
+        "config": {
+            "mix": mix, "concurrency": concurrency, "requests": requests, "hit_ratio": hit_ratio,
+            "hot_houses": hot_houses, "redis": "url" if redis not in ("none", "fake") else redis, "seed": seed,
+            "env": {name: value for name, value in os.environ.items() if name.startswith((
+                "MODEL_", "INFERENCE_", "BATCH_", "CACHE_", "L1_", "REDIS_",
+            )) and name != "REDIS_URL"},
+            "python": platform.python_version(),
+        },
+        "seconds": round(elapsed, 3),
+        "overall": summarize([sample for kind in names for sample in samples[kind]], elapsed),
+        "by_payload": {kind: summarize(samples[kind], elapsed) for kind in names},
+        "cache": {"hits": hits, "misses": misses, "hit_ratio": round(hits / ((hits + misses) or 1), 4)},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="In-process throughput and latency benchmark of the prediction API")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("single"),
+                        help="weighted payloads, e.g. single:8,bulk10:1,bulk1k:1 (names: %s)" % ", ".join(PAYLOADS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--hit-ratio", type=float, default=0.0)
+    parser.add_argument("--hot-houses", type=int, default=1000)
+    parser.add_argument("--redis", default="none", help='"none", "fake" or a redis:// URL')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(
+        args.mix, args.concurrency, args.requests, args.hit_ratio, args.hot_houses, args.redis, args.seed,
+    ))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Builds the precomputed prediction index served with PREDICTION_INDEX_PATH.
+#
+#   python -m trainer.build_index model_pipeline.pkl prediction_index.npz \
+#       [--houses recent.npy traffic.csv ...] [--tolerance 0.05] [--step Latitude=0.01 ...]
+#
+# Grid cells are centered on multiples of each feature's step, so a house whose
+# features are rounded to the steps is exactly a cell center. Only cells holding
+# at least one of the given houses are indexed (the California housing data when
+# no --houses are given; the API's WARMUP_RECORD_PATH file is a good source of
+# real traffic). Each cell is checked against the model at its houses and at
+# --samples random points inside it, and dropped if any of them deviates from
+# the center prediction by more than --tolerance. This bounds the error at the
+# sampled points, not everywhere in the cell; keep the steps small.
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.prediction_index import PredictionIndex
+from src.svr_engine import load_model, model_version
+from src.warmup import load_houses
+
+FEATURE_NAMES = ("MedInc", "HouseAge", "AveRooms", "AveBedrms", "Population", "AveOccup", "Latitude", "Longitude")
+# roughly the precision houses are quoted with: a city block, whole years, ...
+DEFAULT_STEPS = {
+    "MedInc": 0.1, "HouseAge": 1.0, "AveRooms": 0.1, "AveBedrms": 0.02,
+    "Population": 50.0, "AveOccup": 0.05, "Latitude": 0.01, "Longitude": 0.01,
+}
+# the grid spans these percentiles of the houses in every feature
+GRID_PERCENTILE = 0.5
+# cells whose sample points are predicted per model call
+CHUNK_CELLS = 1000
+
+
+def parse_step(text: str) -> tuple:
+    name, _, value = text.partition("=")
+    if name not in DEFAULT_STEPS:
+        raise argparse.ArgumentTypeError(f"unknown feature {name!r}, use one of {', '.join(FEATURE_NAMES)}")
+    return name, float(value)
+
+
+def empty_grid(houses: np.ndarray, steps: Dict[str, float], fingerprint: str) -> PredictionIndex:
+    step = np.array([steps[name] for name in FEATURE_NAMES])
+    # outlying houses (a 600 person AveOccup) would stretch the grid past int64
+    # codes; they are left outside it and always go to the model
+    low, high = np.nanpercentile(houses, [GRID_PERCENTILE, 100 - GRID_PERCENTILE], axis=0)
+    origin = (np.floor(low / step + 0.5) - 0.5) * step
+    shape = np.floor((high - origin) / step).astype(np.int64) + 1
+    empty = np.empty(0)
+    return PredictionIndex(origin, step, shape, empty.astype(np.int64), empty, empty, fingerprint)
+
+
+def build_index(
+    model,
+    houses: np.ndarray,
+    fingerprint: str,
+    steps: Dict[str, float] = DEFAULT_STEPS,
+    tolerance: float = 0.05,
+    samples: int = 16,
+    seed: int = 0,
+) -> PredictionIndex:
+    grid = empty_grid(houses, steps, fingerprint)
+    bins, inside = grid.cells(houses)
+    observed = houses[inside]
+    codes, cell_of_house = np.unique(grid.encode(bins[inside]), return_inverse=True)
+    centers = grid.centers(codes)
+    values = np.asarray(model.predict(centers), dtype=np.float64)
+
+    errors = np.zeros(len(codes))
+    np.maximum.at(errors, cell_of_house, np.abs(model.predict(observed) - values[cell_of_house]))
+    rng = np.random.default_rng(seed)
+    for start in range(0, len(codes), CHUNK_CELLS):
+        chunk = slice(start, start + CHUNK_CELLS)
+        offsets = rng.random((len(centers[chunk]), samples, len(FEATURE_NAMES))) - 0.5
+        points = (centers[chunk, None, :] + offsets * grid.step).reshape(-1, len(FEATURE_NAMES))
+        deviation = np.abs(np.asarray(model.predict(points)).reshape(-1, samples) - values[chunk, None])
+        errors[chunk] = np.maximum(errors[chunk], deviation.max(axis=1, initial=0.0))
+
+    keep = errors <= tolerance
+    return PredictionIndex(grid.origin, grid.step, grid.shape, codes[keep], values[keep], errors[keep], fingerprint)
+
+
+def training_houses() -> np.ndarray:
+    from sklearn.datasets import fetch_california_housing
+
+    return fetch_california_housing().data
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute predictions for the grid cells of observed houses")
+    parser.add_argument("model", help="model_pipeline.pkl or a compiled artifact directory")
+    parser.add_argument("output", help="index file to write (.npz)")
+    parser.add_argument("--houses", nargs="+", help=".npy or CSV files of houses, default the training data")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="largest deviation kept, in $100k")
+    parser.add_argument("--samples", type=int, default=16, help="random points checked per cell")
+    parser.add_argument("--step", type=parse_step, action="append", default=[],
+                        help="grid step of one feature, e.g. Latitude=0.01 (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    houses = np.concatenate([load_houses(path) for path in args.houses]) if args.houses else training_houses()
+    started = time.perf_counter()
+    index = build_index(
+        load_model(args.model), houses, model_version(args.model),
+        dict(DEFAULT_STEPS, **dict(args.step)), args.tolerance, args.samples, args.seed,
+    )
+    index.save(args.output)
+    _, covered = index.lookup(houses)
+    print(
+        f"indexed {len(index.codes)} cells covering {covered.mean():.1%} of {len(houses)} houses "
+        f"(max error {index.stats()['max_error']:.4g}) in {time.perf_counter() - started:.1f}s, wrote {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
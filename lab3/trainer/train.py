@@ -1,55 +1,170 @@
-from os import getcwd
-from os.path import exists, join
+# Trains the served model: python -m trainer.train [--search halving] [--force]
+#
+# Cross-validates every candidate of PARAMS, picks the best mean R^2, refits it
+# on the training split and writes model_pipeline.pkl. An existing output is
+# never overwritten silently: pass --force to retrain it.
+#
+# --search grid scores every candidate on all training rows. --search halving
+# (successive halving) scores every candidate on a small sample, keeps the best
+# 1/--factor and repeats with --factor times more rows until the last round
+# uses all of them, which costs a fraction of the full grid.
+#
+# Every scored candidate is appended to --results (JSON lines, with its fold
+# scores and wall time) as soon as it finishes; a rerun with the same settings
+# skips candidates already in the file, so an interrupted search resumes where
+# it stopped. The imputer and scaler fitted for each fold are cached in
+# --cache-dir (Pipeline memory=), so candidates that only differ in their SVR
+# parameters do not refit them.
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
 
 import joblib
-from sklearn.datasets import fetch_california_housing
+import numpy as np
 from sklearn.impute import SimpleImputer
-from sklearn.model_selection import GridSearchCV, train_test_split
-from sklearn.pipeline import make_pipeline
+from sklearn.model_selection import KFold, ParameterGrid, cross_validate, train_test_split
+from sklearn.pipeline import Pipeline, make_pipeline
 from sklearn.preprocessing import RobustScaler
 from sklearn.svm import SVR
 
-# Metadata
-data = fetch_california_housing()
+# fields identifying a scored candidate in the results file
+RESULT_KEY = ("data", "round", "rows", "folds", "candidate")
 
-features = data.feature_names
-X = data.data
-y = data.target
+PARAMS = {
+    "simpleimputer__strategy": ["mean", "median"],
+    "robustscaler__quantile_range": [(25.0, 75.0), (30.0, 70.0)],
+    "svr__C": [0.1, 1.0],
+    "svr__gamma": ["auto", 0.1],
+}
 
-print(f"features: {features}")
 
-for i in range(5):
-    print(f"Example {i}:\n {X[i]}, {y[i]}")
+def make_model(memory: Optional[str] = None) -> Pipeline:
+    return make_pipeline(SimpleImputer(), RobustScaler(), SVR(), memory=memory)
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.33, random_state=42
-)
 
-n_samples, n_features = X.shape
+def candidate_key(params: dict) -> str:
+    return json.dumps(params, sort_keys=True)
 
-# Model Pipeline
-processing_pipeline = make_pipeline(SimpleImputer(), RobustScaler(), SVR())
 
-params = {
-    "simpleimputer__strategy": ["mean", "median"],
-    "robustscaler__quantile_range": [(25.0, 75.0), (30.0, 70.0)],
-    "svr__C": [0.1, 1.0],
-    "svr__gamma": ["auto", 0.1],
-}
+def load_results(path: str) -> Dict[tuple, dict]:
+    # (data, round, rows, folds, candidate key) -> result line; a line cut short by an
+    # interrupted write is ignored and scored again
+    results = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                results[tuple(result[field] for field in RESULT_KEY)] = result
+    return results
+
+
+def evaluate(model: Pipeline, params: dict, X: np.ndarray, y: np.ndarray, folds: int, jobs: int) -> dict:
+    started = time.perf_counter()
+    scores = cross_validate(
+        model.set_params(**params), X, y, cv=KFold(folds, shuffle=True, random_state=0), n_jobs=jobs,
+    )["test_score"]
+    return {
+        "mean_score": float(np.mean(scores)),
+        "std_score": float(np.std(scores)),
+        "fold_scores": scores.tolist(),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def search(
+    X: np.ndarray,
+    y: np.ndarray,
+    candidates: List[dict],
+    halving: bool = True,
+    factor: int = 3,
+    folds: int = 5,
+    results_path: str = "",
+    cache_dir: Optional[str] = None,
+    jobs: int = -1,
+    log: Callable[[str], None] = print,
+) -> dict:
+    """Best candidate by mean cross-validated R^2 on the last round's rows."""
+    rounds = 1
+    if halving:
+        # the last round is left with at most factor candidates
+        remaining = len(candidates)
+        while remaining > factor:
+            remaining = math.ceil(remaining / factor)
+            rounds += 1
+    # every round samples a prefix of one fixed shuffle, so a resumed run sees the same rows
+    order = np.random.default_rng(0).permutation(len(X))
+    # results scored on other data (a new dataset or split) are not reused
+    data = joblib.hash((X, y))[:12]
+    done = load_results(results_path)
+    alive = list(candidates)
+    for round_number in range(rounds):
+        rows = max(folds * 2, len(X) // factor ** (rounds - 1 - round_number))
+        sample = order[:rows]
+        scored = []
+        for params in alive:
+            key = (data, round_number, rows, folds, candidate_key(params))
+            result = done.get(key)
+            resumed = result is not None
+            if not resumed:
+                result = dict(zip(RESULT_KEY, key))
+                result.update(evaluate(make_model(cache_dir), params, X[sample], y[sample], folds, jobs))
+                if results_path:
+                    with open(results_path, "a") as f:
+                        f.write(json.dumps(result) + "\n")
+            scored.append((result["mean_score"], params))
+            log(
+                f"round {round_number} ({rows} rows) {candidate_key(params)}: R^2 {result['mean_score']:.3f} "
+                f"+/- {result['std_score']:.3f} in {result['seconds']:.1f}s{' (resumed)' if resumed else ''}"
+            )
+        scored.sort(key=lambda item: -item[0])
+        alive = [params for _, params in scored[:max(1, math.ceil(len(scored) / factor))]]
+    best_score, best_params = scored[0]
+    return {"params": best_params, "score": best_score}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Train the housing price model")
+    parser.add_argument("--output", default="model_pipeline.pkl")
+    parser.add_argument("--force", action="store_true", help="overwrite an existing --output")
+    parser.add_argument("--search", choices=("halving", "grid"), default="halving")
+    parser.add_argument("--factor", type=int, default=3, help="halving: candidates kept is 1/factor per round")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--results", default="train_results.jsonl", help="per-candidate results, resumed from")
+    parser.add_argument("--cache-dir", default=".train_cache", help="fitted preprocessing cache, '' to disable")
+    parser.add_argument("--jobs", type=int, default=-1, help="folds fitted in parallel")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.output) and not args.force:
+        sys.exit(f"{args.output} already exists, pass --force to retrain it")
+
+    from sklearn.datasets import fetch_california_housing
+
+    data = fetch_california_housing()
+    print(f"features: {data.feature_names}")
+    X_train, X_test, y_train, y_test = train_test_split(data.data, data.target, test_size=0.33, random_state=42)
 
-grid = GridSearchCV(processing_pipeline, param_grid=params, n_jobs=-1, cv=5, verbose=3)
+    started = time.perf_counter()
+    best = search(
+        X_train, y_train, list(ParameterGrid(PARAMS)), args.search == "halving", args.factor, args.folds,
+        args.results, args.cache_dir or None, args.jobs,
+    )
+    model = make_model().set_params(**best["params"]).fit(X_train, y_train)
+    print(f"Search and refit took {time.perf_counter() - started:.1f}s")
+    print(f"Train R^2 Score : {model.score(X_train, y_train):.3f}")
+    print(f"Test R^2 Score : {model.score(X_test, y_test):.3f}")
+    print(f"Best R^2 Score Through {args.search.title()} Search : {best['score']:.3f}")
+    print(f"Best Parameters : {best['params']}")
 
-model_filename = "model_pipeline.pkl"
-model_path = join(getcwd(), model_filename)
-print(model_path)
-if not exists(model_path):
-    grid.fit(X_train, y_train)
+    joblib.dump(model, args.output)
+    print(f"wrote {args.output}")
 
-    print(f"Train R^2 Score : {grid.best_estimator_.score(X_train, y_train):.3f}")
-    print(f"Test R^2 Score : {grid.best_estimator_.score(X_test, y_test):.3f}")
-    print(f"Best R^2 Score Through Grid Search : {grid.best_score_:.3f}")
-    print(f"Best Parameters : {grid.best_params_}")
 
-    joblib.dump(grid.best_estimator_, model_path)
-else:
-    print("Model has already been trained, no need to rerun")
+if __name__ == "__main__":
+    main()